@@ -0,0 +1,15 @@
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+import models
+
+# --- Shared Query Helpers ---
+
+def load_tags(db: Session, *tag_id_lists: Optional[Iterable[int]]) -> Dict[int, models.Tag]:
+    """
+    Fetches every tag referenced by the given id lists in one IN query instead of one query per id.
+    Lists that are None or empty are skipped. Returns the tags keyed by id; unknown ids are simply absent.
+    """
+    tag_ids = {tag_id for tag_ids in tag_id_lists if tag_ids for tag_id in tag_ids}
+    if not tag_ids:
+        return {}
+    return {tag.id: tag for tag in db.query(models.Tag).filter(models.Tag.id.in_(tag_ids)).all()}
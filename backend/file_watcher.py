@@ -39,8 +39,8 @@ class ImageChangeEventHandler(FileSystemEventHandler):
         return image_processor.is_supported_media(path)
 
     def _schedule_broadcast(self, message: Dict):
-        """Safely schedules a broadcast on the main asyncio event loop."""
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), self.loop)
+        """Safely queues a broadcast on the main asyncio event loop."""
+        manager.queue_broadcast_json(message)
 
     def on_created(self, event: FileSystemEvent):
         if not event.is_directory and self._is_supported_media(event.src_path):
@@ -133,7 +133,7 @@ class ImageChangeEventHandler(FileSystemEventHandler):
                     
                     if not is_source_admin or not is_dest_admin:
                         # If either path is public, broadcast to all.
-                        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), self.loop)
+                        manager.queue_broadcast_json(message)
                         print(f"File Watcher: Sent 'refresh_images' (moved) notification to all users.")
                     else:
                         # If both are admin-only, broadcast only to admins.
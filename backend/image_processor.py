@@ -7,7 +7,7 @@ import mimetypes
 from datetime import datetime, timezone
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, not_, text
+from sqlalchemy import func, text, bindparam, exists
 import json, time
 from typing import Tuple, Optional
 import threading
@@ -20,6 +20,8 @@ import database
 import config
 import schemas
 import search_handler
+import thumbnail_index
+import settings_cache
 
 # Define supported image and video MIME types
 # This list can be expanded based on your needs
@@ -87,12 +89,22 @@ def get_meta(filepath: str) -> Tuple[dict, Optional[int], Optional[int]]:
 
     return {}, None, None # Default return if no other condition is met
  
+# FTS row statements, built once. The column list matches the dict returned by
+# search_handler.flatten_exif_to_fts; rowid is the location id.
+_FTS_COLUMNS = "rowid, location_id, path, filename, prompt, negative_prompt, model, sampler, scheduler, loras, upscaler, application, tags, stub, full_text"
+_FTS_VALUES = ":location_id, :location_id, :path, :filename, :prompt, :negative_prompt, :model, :sampler, :scheduler, :loras, :upscaler, :application, :tags, :stub, :full_text"
+_FTS_INSERT_SQL = text(f"INSERT INTO image_fts_index ({_FTS_COLUMNS}) VALUES ({_FTS_VALUES})")
+_FTS_UPSERT_SQL = text(f"INSERT OR REPLACE INTO image_fts_index ({_FTS_COLUMNS}) VALUES ({_FTS_VALUES})")
+
+# Rows per executemany call while rebuilding the FTS index
+FTS_REBUILD_BATCH_SIZE = 1000
+
 def update_fts_entry(db: Session, location_id: int):
     """Updates or inserts an entry in the FTS index for a specific location."""
     try:
         # Fetch the location with content to ensure we have the latest data
         loc = db.query(models.ImageLocation).options(
-            joinedload(models.ImageLocation.content).joinedload(models.ImageContent.tags)
+            joinedload(models.ImageLocation.content).selectinload(models.ImageContent.tags)
         ).filter(models.ImageLocation.id == location_id).first()
         if not loc or not loc.content:
             return
@@ -109,11 +121,7 @@ def update_fts_entry(db: Session, location_id: int):
         data = search_handler.flatten_exif_to_fts(loc.id, loc.path, loc.filename, exif, tags_str)
         
         # Use INSERT OR REPLACE to handle both new and updated entries
-        sql = text("""
-            INSERT OR REPLACE INTO image_fts_index (rowid, location_id, path, filename, prompt, negative_prompt, model, sampler, scheduler, loras, upscaler, application, tags, stub, full_text) 
-            VALUES (:location_id, :location_id, :path, :filename, :prompt, :negative_prompt, :model, :sampler, :scheduler, :loras, :upscaler, :application, :tags, :stub, :full_text)
-        """)
-        db.execute(sql, data)
+        db.execute(_FTS_UPSERT_SQL, data)
     except Exception as e:
         print(f"Error updating FTS entry for location {location_id}: {e}")
 
@@ -124,6 +132,16 @@ def remove_fts_entry(db: Session, location_id: int):
     except Exception as e:
         print(f"Error removing FTS entry for location {location_id}: {e}")
 
+def remove_fts_entries(db: Session, location_ids: list):
+    """Removes the FTS index entries for several locations with a single statement."""
+    if not location_ids:
+        return
+    try:
+        stmt = text("DELETE FROM image_fts_index WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True))
+        db.execute(stmt, {"ids": list(location_ids)})
+    except Exception as e:
+        print(f"Error removing FTS entries for {len(location_ids)} locations: {e}")
+
 def add_file_to_db(
     db: Session,
     file_full_path: str,
@@ -245,13 +263,12 @@ def cleanup_orphaned_image_locations(db: Session):
     # Finds and removes ImageLocation entries where the path does not exist in the ImagePath table.
     print("Checking for orphaned ImageLocation entries...")
     
-    # Create a subquery to select all valid paths from the ImagePath table.
-    valid_paths_subquery = db.query(models.ImagePath.path).scalar_subquery()
+    # Correlated check for a matching ImagePath row. NOT EXISTS lets SQLite probe the
+    # path index per location (an anti-join) instead of materializing every valid path.
+    has_valid_path = exists().where(models.ImagePath.path == models.ImageLocation.path).correlate(models.ImageLocation)
 
-    # Find ImageLocation entries where the path is not in the subquery of valid paths.
-    orphaned_locations_query = db.query(models.ImageLocation).filter(
-        not_(models.ImageLocation.path.in_(valid_paths_subquery))
-    )
+    # Find ImageLocation entries whose path has no ImagePath entry.
+    orphaned_locations_query = db.query(models.ImageLocation).filter(~has_valid_path)
 
     # Execute the delete operation.
     num_deleted = orphaned_locations_query.delete(synchronize_session=False)
@@ -402,11 +419,12 @@ def generate_thumbnail_in_background(
     loop: Optional[asyncio.AbstractEventLoop] = None, # Add loop parameter
 ):
     # Use a short-lived session to get settings
+    thumb_size = config.THUMBNAIL_SIZE
     try:
         with database.SessionLocal() as db:
-            thumb_size_setting = db.query(models.Setting).filter_by(name='max_thumb_size').first()
-            if thumb_size_setting and thumb_size_setting.value:
-                thumb_size = int(thumb_size_setting.value)
+            max_thumb_size = settings_cache.get_cached_setting(db, 'max_thumb_size')
+            if max_thumb_size:
+                thumb_size = int(max_thumb_size)
     except Exception as e:
         print(f"Background: Error fetching settings for image ID {image_id}: {e}")
 
@@ -514,6 +532,7 @@ def generate_thumbnail(
 
     # Atomic move to final destination
     os.replace(temp_thumb_filepath, thumb_filepath)
+    thumbnail_index.thumbnail_bloom.add(output_filename_base)
 
     if (temp_image_path):
         if (os.path.exists(temp_image_path)):
@@ -657,38 +676,24 @@ def rebuild_fts_index(db_session_factory):
         print(f"[{datetime.now().isoformat()}] Starting FTS index rebuild...")
         start_time = time.time()
         
+        # The whole rebuild runs in one explicit transaction, so there is a single commit
+        # (and WAL sync) at the end and searches keep using the old index until then.
+        # An explicit BEGIN is needed because the sqlite3 driver autocommits DDL otherwise.
+        db.execute(text("BEGIN"))
+
         # Drop and recreate the table to ensure clean state and correct schema
         db.execute(text("DROP TABLE IF EXISTS image_fts_index"))
-        db.execute(text("""
-            CREATE VIRTUAL TABLE image_fts_index USING fts5(
-                location_id UNINDEXED,
-                path,
-                filename,
-                prompt,
-                negative_prompt,
-                model,
-                sampler,
-                scheduler,
-                loras,
-                upscaler,
-                application,
-                tags,
-                stub,
-                full_text
-            )
-        """))
-        db.commit()
+        db.execute(text(models.FTS_TABLE_DDL))
         
         # Fetch all locations with their content
         locations = db.query(models.ImageLocation).options(
-            joinedload(models.ImageLocation.content).joinedload(models.ImageContent.tags)
+            joinedload(models.ImageLocation.content).selectinload(models.ImageContent.tags)
         ).all()
         
-        batch_size = 100
         batch = []
+        indexed = 0
         
         for loc in locations:
-            print(f"Processing ID: {loc.id} Path: {loc.path} Filename: {loc.filename}")
             content = loc.content
             if not content:
                 continue
@@ -704,17 +709,18 @@ def rebuild_fts_index(db_session_factory):
             data = search_handler.flatten_exif_to_fts(loc.id, loc.path, loc.filename, exif, tags_str)
             batch.append(data)
             
-            if len(batch) >= batch_size:
-                db.execute(text("INSERT INTO image_fts_index (rowid, location_id, path, filename, prompt, negative_prompt, model, sampler, scheduler, loras, upscaler, application, tags, stub, full_text) VALUES (:location_id, :location_id, :path, :filename, :prompt, :negative_prompt, :model, :sampler, :scheduler, :loras, :upscaler, :application, :tags, :stub, :full_text)"), batch)
-                db.commit()
+            if len(batch) >= FTS_REBUILD_BATCH_SIZE:
+                db.execute(_FTS_INSERT_SQL, batch)
+                indexed += len(batch)
                 batch = []
         
         if batch:
-            db.execute(text("INSERT INTO image_fts_index (rowid, location_id, path, filename, prompt, negative_prompt, model, sampler, scheduler, loras, upscaler, application, tags, stub, full_text) VALUES (:location_id, :location_id, :path, :filename, :prompt, :negative_prompt, :model, :sampler, :scheduler, :loras, :upscaler, :application, :tags, :stub, :full_text)"), batch)
-            db.commit()
+            db.execute(_FTS_INSERT_SQL, batch)
+            indexed += len(batch)
+        db.commit()
             
         duration = time.time() - start_time
-        print(f"[{datetime.now().isoformat()}] FTS index rebuild finished in {duration:.2f} seconds.")
+        print(f"[{datetime.now().isoformat()}] FTS index rebuild finished for {indexed} images in {duration:.2f} seconds.")
     except Exception as e:
         print(f"Error rebuilding FTS index: {e}")
         db.rollback()
@@ -731,6 +737,7 @@ def purge_thumbnails() -> int:
         return 0
     
     count = 0
+    thumbnail_index.thumbnail_bloom.clear()
     for item in directory.iterdir():
         if item.is_file():
             try:
@@ -1,7 +1,8 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import os, threading, logging
+import os, threading, logging, queue
+from logging.handlers import QueueHandler, QueueListener
 from contextlib import asynccontextmanager
 import asyncio
 from typing import Optional
@@ -12,6 +13,7 @@ import config
 import models
 import database
 import image_processor
+import thumbnail_index
 import auth
 from websocket_manager import manager
 from file_watcher import start_file_watcher, stop_file_watcher
@@ -59,6 +61,37 @@ class AccessLogFilter(logging.Filter):
                         return False
         return True
 
+# --- Application Logging ---
+# Modules that use the logging package (rather than print) hand their records to a
+# queue; a listener thread does the formatting and the actual writes, so logging
+# from the event loop never blocks on stderr.
+APP_LOGGERS = ("websocket_manager", "search_handler")
+_log_listener: Optional[QueueListener] = None
+
+def start_app_logging(level: int = logging.INFO):
+    global _log_listener
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s: %(message)s"))
+    _log_listener = QueueListener(log_queue, stream_handler)
+    queue_handler = QueueHandler(log_queue)
+    for name in APP_LOGGERS:
+        app_logger = logging.getLogger(name)
+        app_logger.setLevel(level)
+        app_logger.addHandler(queue_handler)
+        app_logger.propagate = False
+    _log_listener.start()
+
+def stop_app_logging():
+    global _log_listener
+    if _log_listener:
+        _log_listener.stop() # Flushes anything still queued
+        _log_listener = None
+    for name in APP_LOGGERS:
+        app_logger = logging.getLogger(name)
+        for handler in [h for h in app_logger.handlers if isinstance(h, QueueHandler)]:
+            app_logger.removeHandler(handler)
+
 # --- Application Lifespan Context Manager ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -66,6 +99,7 @@ async def lifespan(app: FastAPI):
 
     # Startup Events
     print("Application startup initiated...")
+    start_app_logging()
 
     # Filter out noise from uvicorn access logs
     logging.getLogger("uvicorn.access").addFilter(AccessLogFilter(
@@ -78,6 +112,7 @@ async def lifespan(app: FastAPI):
     # Store the main event loop in a globally accessible place
     database.main_event_loop = asyncio.get_running_loop()
     print("Main event loop captured.")
+    manager.start_outbox(database.main_event_loop)
     models.Base.metadata.create_all(bind=database.engine)
     print("Database tables checked/created.")
 
@@ -209,6 +244,11 @@ async def lifespan(app: FastAPI):
                 first_filter.tags.append(first_filter_tag)
                 db.commit()
 
+        # Seed the log counter from the existing rows the first time it's created
+        if not db.get(models.LogCount, 1):
+            db.add(models.LogCount(id=1, value=db.query(models.Log).count()))
+            db.commit()
+
         if not db.query(models.User).first():
             print("No users found. Creating a default admin user: admin/adminpass")
             hashed_password = auth.get_password_hash("adminpass")
@@ -234,6 +274,9 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
 
+    # Warm the thumbnail index in the background; lookups fall back to the filesystem until it's ready
+    threading.Thread(target=thumbnail_index.warm_thumbnail_index, daemon=True).start()
+
     # Start the file watcher in a background thread
     print("Starting file watcher thread...", flush=True)
     watcher_thread = threading.Thread(
@@ -246,6 +289,8 @@ async def lifespan(app: FastAPI):
     # Shutdown Events
     print("Application shutdown initiated.")
     stop_file_watcher()
+    manager.stop_outbox()
+    stop_app_logging()
 
 
 # --- Initialize FastAPI app with the lifespan context manager ---
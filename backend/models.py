@@ -1,5 +1,5 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Text, UniqueConstraint, Index, event, text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime, timezone
@@ -153,6 +153,22 @@ class Log(Base):
 
     user = relationship("User")
 
+class LogCount(Base):
+    # Single-row table holding the number of log entries, so the log viewer
+    # can show a total without running COUNT(*) over the whole logs table.
+    __tablename__ = "log_count"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+# Keep the counter in step with ORM inserts/deletes of Log rows, with one UPDATE per flush
+# rather than one per row, since the log writer inserts whole batches at once.
+# Bulk deletes bypass this event and must reset the counter themselves.
+@event.listens_for(Session, "after_flush")
+def adjust_log_count(session, flush_context):
+    delta = sum(isinstance(obj, Log) for obj in session.new) - sum(isinstance(obj, Log) for obj in session.deleted)
+    if delta:
+        session.connection().execute(LogCount.__table__.update().where(LogCount.id == 1).values(value=LogCount.value + delta))
+
 class ImageFTS(Base):
     # Shadow model for the SQLite FTS5 Virtual Table.
     __tablename__ = "image_fts_index"
@@ -173,27 +189,37 @@ class ImageFTS(Base):
     tags = Column(Text)
     full_text = Column(Text)
 
+# --- FTS5 Table Definition ---
+# Shared by create_all() below and the manual index rebuild in image_processor.
+# unicode61 with remove_diacritics 2 folds accents, so "cafe" also finds "café".
+# The prefix indexes let short wildcard searches (e.g. MODEL:v1*) probe a
+# dedicated index instead of scanning every term that starts with the prefix.
+# Existing databases pick this up the next time the FTS index is rebuilt.
+FTS_TABLE_DDL = """
+    CREATE VIRTUAL TABLE image_fts_index USING fts5(
+        location_id UNINDEXED,
+        path,
+        filename,
+        prompt,
+        negative_prompt,
+        model,
+        sampler,
+        scheduler,
+        loras,
+        upscaler,
+        application,
+        tags,
+        stub,
+        full_text,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+"""
+
 # --- SQL Compilation Logic ---
 # This ensures that when create_all() is run,
 # it creates a VIRTUAL table instead of a normal one.
 @event.listens_for(ImageFTS.__table__, "after_create")
 def create_fts_table(target, connection, **kw):
     connection.execute(text("DROP TABLE IF EXISTS image_fts_index;"))
-    connection.execute(text("""
-        CREATE VIRTUAL TABLE image_fts_index USING fts5(
-            location_id UNINDEXED,
-            path,
-            filename,
-            prompt,
-            negative_prompt,
-            model,
-            sampler,
-            scheduler,
-            loras,
-            upscaler,
-            application,
-            tags,
-            stub,
-            full_text
-        );
-    """))
\ No newline at end of file
+    connection.execute(text(FTS_TABLE_DDL))
@@ -9,6 +9,7 @@ import database
 import models
 import schemas
 import config
+import settings_cache
 
 # Initialize FastAPI Router for authentication routes
 router = APIRouter()
@@ -23,8 +24,8 @@ def signup(user_data: schemas.UserCreate, db: Session = Depends(database.get_db)
     Non-admin user signup is controlled by the 'allow_signup' global setting.
     """
     # Check if global signup is allowed for non-admin users
-    allow_signup_setting = db.query(models.Setting).filter_by(name='allow_signup').first()
-    if allow_signup_setting and allow_signup_setting.value.lower() != 'true':
+    allow_signup = settings_cache.get_cached_flag(db, 'allow_signup')
+    if allow_signup is False:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User signup is currently disabled by administrator."
@@ -62,8 +63,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    allow_login_setting = db.query(models.Setting).filter_by(name='allow_login').first()
-    if allow_login_setting and allow_login_setting.value.lower() != 'true':
+    allow_login = settings_cache.get_cached_flag(db, 'allow_login')
+    if allow_login is False:
         if not user.admin:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
-import asyncio
 
 import auth
+import crud
 import database
 import models
 import schemas
@@ -32,14 +32,15 @@ def create_filter(filter_in: schemas.FilterCreate, db: Session = Depends(databas
         third_stage_color=filter_in.third_stage_color,
         third_stage_icon=filter_in.third_stage_icon,
     )
+    tags_by_id = crud.load_tags(db, filter_in.tag_ids, filter_in.neg_tag_ids)
     for tag_id in filter_in.tag_ids:
-        tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+        tag = tags_by_id.get(tag_id)
         if tag:
             db_filter.tags.append(tag)
         else:
             raise HTTPException(status_code=400, detail=f"Tag with ID {tag_id} not found for positive tags.")
     for tag_id in filter_in.neg_tag_ids:
-        tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+        tag = tags_by_id.get(tag_id)
         if tag:
             db_filter.neg_tags.append(tag)
         else:
@@ -51,7 +52,7 @@ def create_filter(filter_in: schemas.FilterCreate, db: Session = Depends(databas
     # After creating a filter, broadcast a general refresh message
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated"}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return db_filter
 
@@ -63,7 +64,7 @@ def read_filters(
     # Retrieves a list of filters.
     # Eager loads associated positive and negative tags.
 
-    query = db.query(models.Filter).options(joinedload(models.Filter.tags), joinedload(models.Filter.neg_tags))
+    query = db.query(models.Filter).options(selectinload(models.Filter.tags), selectinload(models.Filter.neg_tags))
     if not current_user.admin:
         query = query.filter_by(admin_only=False)
     filters = query.all()
@@ -74,7 +75,7 @@ def read_filter(filter_id: int, db: Session = Depends(database.get_db)):
     # Retrieves a single filter by ID. Accessible by all.
     # Eager loads associated positive and negative tags.
 
-    db_filter = db.query(models.Filter).options(joinedload(models.Filter.tags), joinedload(models.Filter.neg_tags)).filter(models.Filter.id == filter_id).first()
+    db_filter = db.query(models.Filter).options(selectinload(models.Filter.tags), selectinload(models.Filter.neg_tags)).filter(models.Filter.id == filter_id).first()
     if db_filter is None:
         raise HTTPException(status_code=404, detail="Filter not found")
     return db_filter
@@ -89,10 +90,11 @@ def update_filter(filter_id: int, filter_in: schemas.FilterUpdate, db: Session =
 
     for key, value in filter_in.dict(exclude_unset=True, exclude={'tag_ids', 'neg_tag_ids'}).items():
         setattr(db_filter, key, value)
+    tags_by_id = crud.load_tags(db, filter_in.tag_ids, filter_in.neg_tag_ids)
     if filter_in.tag_ids is not None:
         db_filter.tags.clear()
         for tag_id in filter_in.tag_ids:
-            tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+            tag = tags_by_id.get(tag_id)
             if tag:
                 db_filter.tags.append(tag)
             else:
@@ -100,7 +102,7 @@ def update_filter(filter_id: int, filter_in: schemas.FilterUpdate, db: Session =
     if filter_in.neg_tag_ids is not None:
         db_filter.neg_tags.clear()
         for tag_id in filter_in.neg_tag_ids:
-            tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+            tag = tags_by_id.get(tag_id)
             if tag:
                 db_filter.neg_tags.append(tag)
             else:
@@ -111,7 +113,7 @@ def update_filter(filter_id: int, filter_in: schemas.FilterUpdate, db: Session =
     # After updating a filter, broadcast a general refresh message
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated"}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return db_filter
 
@@ -128,6 +130,6 @@ def delete_filter(filter_id: int, db: Session = Depends(database.get_db), curren
     # After deleting a filter, broadcast a general refresh message
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated"}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return
\ No newline at end of file
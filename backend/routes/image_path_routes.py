@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 import threading
-import os, asyncio
+import os
 
 import auth
+import crud
 import database
 import models
 import schemas
@@ -86,8 +87,9 @@ def update_image_path(path_id: int, path: schemas.ImagePathUpdate, db: Session =
     
     if path.tag_ids is not None:
         db_image_path.tags.clear()
+        tags_by_id = crud.load_tags(db, path.tag_ids)
         for tag_id in path.tag_ids:
-            tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+            tag = tags_by_id.get(tag_id)
             if tag:
                 db_image_path.tags.append(tag)
             else:
@@ -104,7 +106,7 @@ def update_image_path(path_id: int, path: schemas.ImagePathUpdate, db: Session =
                 models.ImageContent.content_hash.in_(content_hashes_in_path)
             ).all()
 
-            tags_to_add = db.query(models.Tag).filter(models.Tag.id.in_(newly_added_tag_ids)).all()
+            tags_to_add = [tags_by_id[tag_id] for tag_id in newly_added_tag_ids if tag_id in tags_by_id]
 
             for image_content in images_to_update:
                 for tag in tags_to_add:
@@ -118,7 +120,7 @@ def update_image_path(path_id: int, path: schemas.ImagePathUpdate, db: Session =
     # After updating folder tags, broadcast a general refresh message
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated"}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return db_image_path
 
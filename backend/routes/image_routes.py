@@ -1,21 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_, or_, not_, select, text
+from sqlalchemy import func, and_, or_, not_, select, text, literal_column, tuple_
 from typing import List, Optional
-from pathlib import Path
 from datetime import datetime
-import os, json, threading, mimetypes, asyncio
+import os, json, threading, mimetypes, asyncio, base64, binascii
 import concurrent.futures
 from websocket_manager import manager # Import the WebSocket manager
 import search_handler
 
 import auth
+import crud
 import database
 import models
 import schemas # type: ignore
 import config
 import image_processor
+import thumbnail_index
 
 router = APIRouter()
 
@@ -28,6 +29,10 @@ processing_lock = threading.Lock() # type: ignore
 
 def _run_thumbnail_generation(image_id, content_hash, filepath, loop):
     try:
+        # The file check happens here, once per queued image, rather than on every request
+        if not os.path.isfile(filepath):
+            print(f"Could not generate thumbnail for image {image_id}: {filepath} not found.")
+            return
         image_processor.generate_thumbnail_in_background(image_id, content_hash, filepath, loop)
     finally:
         with processing_lock:
@@ -40,6 +45,69 @@ def trigger_thumbnail_generation_task(image_id, content_hash, filepath, loop):
         processing_thumbnails.add(image_id)
     thumbnail_executor.submit(_run_thumbnail_generation, image_id, content_hash, filepath, loop)
 
+# Filter expressions are already cached as FTS strings by search_handler, so the SQL
+# side only needs one bound MATCH clause, built once and reused for every request.
+# The MATCH runs in its own subquery over the FTS rowids (which are location ids), so
+# SQLite always resolves it through the FTS index first instead of planning it as one
+# side of a join mixed with predicates on the other tables.
+_FTS_MATCH_CLAUSE = text("image_fts_index MATCH :fts")
+_FTS_MATCHING_IDS = select(literal_column("rowid")).select_from(models.ImageFTS.__table__).where(_FTS_MATCH_CLAUSE)
+
+# Thumbnail locations on disk and as served to the frontend; the per-image name is
+# formatted once and joined onto these.
+THUMBNAILS_DIR_STR = str(config.THUMBNAILS_DIR)
+THUMBNAIL_URL_PREFIX = "/static_assets/generated_media/thumbnails/"
+
+# Number of parallel unlink calls when deleting many files at once.
+FILE_DELETE_WORKERS = 8
+
+def _try_unlink(full_path):
+    # Deletes a file from disk, ignoring files that are already gone.
+    try:
+        os.unlink(full_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Error deleting file {full_path}: {e}")
+
+# --- Visibility Filters ---
+# Hides admin-only folders and images carrying admin-only tags from non-admin users.
+# Built once at import; SQLAlchemy expressions are immutable and safe to reuse.
+# The tag check is an uncorrelated NOT IN, so SQLite builds the set of images with
+# admin-only tags once per query instead of running an EXISTS probe for every row.
+# Folder tags are copied onto image content, so this also covers admin-only folder tags.
+_ADMIN_TAGGED_IMAGE_IDS = select(models.image_tags.c.image_id)\
+    .join(models.Tag, models.Tag.id == models.image_tags.c.tag_id)\
+    .where(models.Tag.admin_only == True)
+
+_NON_ADMIN_FILTER = and_(
+    models.ImagePath.admin_only == False,
+    models.ImageContent.content_id.not_in(_ADMIN_TAGGED_IMAGE_IDS),
+)
+
+# --- Pagination Cursors ---
+
+def _encode_cursor(sort_value, content_id, location_id, sort_by, sort_order):
+    # Packs the keyset position of the last image, plus the sort it belongs to, into an opaque token.
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = {'sv': sort_value, 'cid': content_id, 'lid': location_id, 'sb': sort_by, 'so': sort_order}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+def _decode_cursor(token, sort_by, sort_order):
+    # Unpacks a cursor token, rejecting tokens that are malformed or were issued for a different sort.
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        sort_value, content_id, location_id = payload['sv'], int(payload['cid']), int(payload['lid'])
+        cursor_sort = (payload['sb'], payload['so'])
+        if sort_by == 'date_created':
+            sort_value = datetime.fromisoformat(sort_value)
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    if cursor_sort != (sort_by, sort_order):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pagination cursor does not match the requested sort.")
+    return sort_value, content_id, location_id
+
 # --- Image Endpoints ---
 
 @router.get("/thumbnails/{image_id}", response_class=FileResponse)
@@ -52,26 +120,15 @@ def get_thumbnail(image_id: int, db: Session = Depends(database.get_db)):
         print(f"Image with ID {image_id} not found")
         raise HTTPException(status_code=404, detail="Image not found")
 
-    expected_thumbnail_path = os.path.join(config.THUMBNAILS_DIR, f"{db_image.content_hash}_thumb.webp")
+    expected_thumbnail_path = os.path.join(THUMBNAILS_DIR_STR, db_image.content_hash + thumbnail_index.THUMB_SUFFIX)
 
-    if os.path.exists(expected_thumbnail_path):
+    if thumbnail_index.thumbnail_exists(db_image.content_hash, expected_thumbnail_path):
         return FileResponse(expected_thumbnail_path, media_type="image/webp")
     else:
         # Trigger background generation
         original_filepath = os.path.join(db_image.path, db_image.filename)
 
-        thumb_size_setting = db.query(models.Setting).filter_by(name='thumb_size').first()
-        config_thumbnail_size = config.THUMBNAIL_SIZE
-
-        if thumb_size_setting and thumb_size_setting.value:
-            thumb_size = int(thumb_size_setting.value)
-        else:
-            thumb_size = config_thumbnail_size
-
-        if original_filepath and Path(original_filepath).is_file():
-            trigger_thumbnail_generation_task(image_id, db_image.content_hash, original_filepath, database.main_event_loop)
-        else:
-            print(f"Could not trigger thumbnail generation for {db_image.filename}: original_filepath not found or invalid.")
+        trigger_thumbnail_generation_task(image_id, db_image.content_hash, original_filepath, database.main_event_loop)
 
         # Return a placeholder image or a loading indicator
         placeholder_path = os.path.join(config.STATIC_DIR, "placeholder.png")  # Or a loading animation
@@ -83,9 +140,7 @@ def read_images(
     search_query: Optional[str] = Query(None, description="Search term for filename or path"),
     sort_by: str = Query("date_created", description="Column to sort by (e.g., filename, date_created, checksum)"),
     sort_order: str = Query("desc", description="Sort order: 'asc' or 'desc'"),
-    last_sort_value: Optional[str] = Query(None, description="Value of the sort_by column for the last_id item (for stable pagination)"),
-    last_content_id: Optional[int] = Query(None, description="Content ID of the last item for pagination tie-breaking."),
-    last_location_id: Optional[int] = Query(None, description="Location ID of the last item for pagination tie-breaking."),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the last item of the previous page."),
     db: Session = Depends(database.get_db),
     active_stages_json: Optional[str] = Query(None, description="JSON string of active filter stages, e.g., '{\"1\":0, \"2\":1}'"),
     trash_only: bool = Query(False, description="If true, only returns images marked as deleted."),
@@ -97,7 +152,6 @@ def read_images(
     Triggers thumbnail generation if not found.
     """
     query = db.query(models.ImageLocation)
-    query = query.join(models.ImageFTS, models.ImageLocation.id == models.ImageFTS.location_id)
     query = query.join(models.ImageContent, models.ImageLocation.content_hash == models.ImageContent.content_hash)
     query = query.outerjoin(models.ImagePath, models.ImagePath.path == models.ImageLocation.path)
     query = query.options(joinedload(models.ImageLocation.content))
@@ -106,8 +160,7 @@ def read_images(
     query = query.filter(models.ImagePath.is_ignored == False)
 
     if not current_user.admin:
-        query = query.filter(models.ImagePath.admin_only == False)
-        query = query.filter(~models.ImageContent.tags.any(models.Tag.admin_only == True))
+        query = query.filter(_NON_ADMIN_FILTER)
 
     if trash_only:
         query = query.filter(models.ImageLocation.deleted == True)
@@ -115,33 +168,28 @@ def read_images(
         # If not viewing trash, filter out deleted items and apply all search/filter criteria
         query = query.filter(models.ImageLocation.deleted == False)
 
-        # Pull all filters from database
-        db_filters = db.query(models.Filter).options(joinedload(models.Filter.tags), joinedload(models.Filter.neg_tags)).all()
-
-        active_filters = search_handler.get_active_filter_stages(db_filters, active_stages_json)
-
-        built_query = search_handler.get_final_fts_expression(search_query, active_filters)
+        # Build (or reuse) the FTS expression for the search query and active filters
+        built_query = search_handler.get_cached_fts_expression(db, search_query, active_stages_json)
         #print(f"Built FTS expression: {built_query}") # Used for debugging expressions
         if built_query:
-            query = query.filter(text("image_fts_index MATCH :fts")).params(fts=built_query)
+            # The FTS table is only queried when there is something to match, so
+            # unfiltered listings and the trash view skip the virtual table entirely.
+            query = query.filter(models.ImageLocation.id.in_(_FTS_MATCHING_IDS)).params(fts=built_query)
 
-    # Pagination Logic
-    if all(v is not None for v in [last_sort_value, last_content_id, last_location_id]):
-        val = last_sort_value
-        if sort_by == 'date_created':
-            val = datetime.fromisoformat(last_sort_value.replace('Z', '+00:00'))
-        
-        sort_col = getattr(models.ImageContent if sort_by != 'filename' else models.ImageLocation, sort_by)
-        cursor = (sort_col, models.ImageContent.content_id, models.ImageLocation.id)
-        last_vals = (val, last_content_id, last_location_id)
-        
-        query = query.filter(cursor < last_vals if sort_order == 'desc' else cursor > last_vals)
-
-    # Apply sorting
     sort_col = getattr(models.ImageContent if sort_by != 'filename' else models.ImageLocation, sort_by)
-    order_func = sort_col.desc if sort_order == 'desc' else sort_col.asc
-    
-    query = query.order_by(order_func(), models.ImageContent.content_id.desc(), models.ImageLocation.id.desc())
+
+    # Pagination Logic
+    if cursor:
+        last_vals = _decode_cursor(cursor, sort_by, sort_order)
+        # Compare as a row value, so rows that tie on the sort column fall back to the id columns
+        keyset = tuple_(sort_col, models.ImageContent.content_id, models.ImageLocation.id)
+        query = query.filter(keyset < tuple_(*last_vals) if sort_order == 'desc' else keyset > tuple_(*last_vals))
+
+    # Apply sorting. The tie-breakers follow the same direction as the cursor comparison above.
+    def order_func(col):
+        return col.desc() if sort_order == 'desc' else col.asc()
+
+    query = query.order_by(order_func(sort_col), order_func(models.ImageContent.content_id), order_func(models.ImageLocation.id))
     images = query.limit(limit).all()
 
     response_images = []
@@ -149,18 +197,16 @@ def read_images(
         img = location.content
 
         # Check if thumbnail exists, if not, trigger generation in background
-        expected_thumbnail_path = os.path.join(config.THUMBNAILS_DIR, f"{img.content_hash}_thumb.webp")
-        thumbnail_url = f"/static_assets/generated_media/thumbnails/{img.content_hash}_thumb.webp"
-        if os.path.exists(expected_thumbnail_path):
+        thumbnail_name = img.content_hash + thumbnail_index.THUMB_SUFFIX
+        expected_thumbnail_path = os.path.join(THUMBNAILS_DIR_STR, thumbnail_name)
+        thumbnail_url = THUMBNAIL_URL_PREFIX + thumbnail_name
+        if thumbnail_index.thumbnail_exists(img.content_hash, expected_thumbnail_path):
             thumbnail_missing = False
         else:
             thumbnail_missing = True
             
             original_filepath = os.path.join(location.path, location.filename)
-            if original_filepath and Path(original_filepath).is_file():
-                trigger_thumbnail_generation_task(location.id, img.content_hash, original_filepath, database.main_event_loop)
-            else:
-                print(f"Could not trigger thumbnail generation for {location.filename}: original_filepath not found or invalid.")
+            trigger_thumbnail_generation_task(location.id, img.content_hash, original_filepath, database.main_event_loop)
 
         response_images.append(schemas.ImageGridResponse(
             id=location.id,
@@ -172,7 +218,16 @@ def read_images(
             is_video=img.is_video,
             content_id=img.content_id
         ))
-    return response_images
+
+    # Hand the client a cursor for the next page on the last item
+    if images:
+        last = images[-1]
+        sort_source = last if sort_by == 'filename' else last.content
+        response_images[-1].cursor = _encode_cursor(
+            getattr(sort_source, sort_by), last.content.content_id, last.id, sort_by, sort_order
+        )
+    # The items are already validated models, so serialize them directly rather than having FastAPI re-validate them
+    return Response(content=schemas.ImageGridListAdapter.dump_json(response_images), media_type="application/json")
 
 @router.get("/images/{image_id}", response_model=schemas.ImageResponse)
 def read_image(
@@ -185,7 +240,7 @@ def read_image(
     # Triggers thumbnail generation if not found.
 
     location_image = db.query(models.ImageLocation).options(
-        joinedload(models.ImageLocation.content).joinedload(models.ImageContent.tags)
+        joinedload(models.ImageLocation.content).selectinload(models.ImageContent.tags)
     ).filter(models.ImageLocation.id == image_id).first()
 
     if location_image is None:
@@ -196,20 +251,17 @@ def read_image(
         raise HTTPException(status_code=404, detail="Image content not found")
     
     # Check if thumbnail exists, if not, trigger generation in background
-    expected_thumbnail_path = os.path.join(config.THUMBNAILS_DIR, f"{db_image.content_hash}_thumb.webp")
-    if os.path.exists(expected_thumbnail_path):
-        thumbnail_url = f"/static_assets/generated_media/thumbnails/{db_image.content_hash}_thumb.webp"
+    thumbnail_name = db_image.content_hash + thumbnail_index.THUMB_SUFFIX
+    expected_thumbnail_path = os.path.join(THUMBNAILS_DIR_STR, thumbnail_name)
+    # The URL points to the expected final location even while the thumbnail is still being generated.
+    thumbnail_url = THUMBNAIL_URL_PREFIX + thumbnail_name
+    if thumbnail_index.thumbnail_exists(db_image.content_hash, expected_thumbnail_path):
         thumbnail_missing = False
     else:
-        # The URL should still point to the expected final location for the frontend.
-        thumbnail_url = f"/static_assets/generated_media/thumbnails/{db_image.content_hash}_thumb.webp"
         thumbnail_missing = True
         original_filepath = os.path.join(location_image.path, location_image.filename)
-        if original_filepath and Path(original_filepath).is_file():
-            print(f"Thumbnail for {location_image.filename} (ID: {location_image.id}) not found. Triggering background generation.")
-            trigger_thumbnail_generation_task(location_image.id, db_image.content_hash, original_filepath, database.main_event_loop)
-        else:
-            print(f"Could not trigger thumbnail generation for {location_image.filename}: original_filepath not found or invalid.")
+        print(f"Thumbnail for {location_image.filename} (ID: {location_image.id}) not found. Triggering background generation.")
+        trigger_thumbnail_generation_task(location_image.id, db_image.content_hash, original_filepath, database.main_event_loop)
 
     exif_data = db_image.exif_data
     if isinstance(exif_data, str):
@@ -232,7 +284,7 @@ def read_image(
         is_video=db_image.is_video,
         width=db_image.width,
         height=db_image.height,
-        tags=list(db_image.tags),
+        tags=db_image.tags,
         content_id=db_image.content_id
     )
 
@@ -252,8 +304,9 @@ def update_image(image_id: int, image_update: schemas.ImageTagUpdate, db: Sessio
 
     if image_update.tag_ids is not None:
         db_image.tags.clear()
+        tags_by_id = crud.load_tags(db, image_update.tag_ids)
         for tag_id in image_update.tag_ids:
-            tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+            tag = tags_by_id.get(tag_id)
             if tag:
                 db_image.tags.append(tag)
             else:
@@ -270,7 +323,7 @@ def update_image(image_id: int, image_update: schemas.ImageTagUpdate, db: Sessio
     # After updating tags, broadcast a general refresh message
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated"}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return
 
@@ -326,7 +379,7 @@ def bulk_update_image_tags(
     # After updating tags, broadcast a refresh message for the affected images
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "tags_updated_bulk", "image_ids": image_ids}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
     return
 
@@ -350,9 +403,9 @@ def mark_image_as_deleted(
     # Broadcast a websocket message to remove the image from all connected clients' views.
     if database.main_event_loop:
         message = {"type": "image_deleted", "image_id": image_id}
-        # Use run_coroutine_threadsafe because we are in a synchronous FastAPI route
-        # calling an asynchronous function in the main event loop.
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        # We are in a synchronous FastAPI route, so hand the broadcast to the main event loop.
+        # queue_broadcast_json is thread-safe and doesn't wait for the send to complete.
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -389,7 +442,7 @@ def mark_images_as_deleted_bulk(
 
     if database.main_event_loop:
         message = {"type": "images_deleted", "image_ids": image_ids}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -428,7 +481,7 @@ def move_images_bulk(
     destination_folder_tags = is_valid_destination.tags
 
     locations_to_move = db.query(models.ImageLocation).options(
-        joinedload(models.ImageLocation.content).joinedload(models.ImageContent.tags)
+        joinedload(models.ImageLocation.content).selectinload(models.ImageContent.tags)
     ).filter(models.ImageLocation.id.in_(image_ids)).all()
 
     if len(locations_to_move) != len(image_ids):
@@ -466,10 +519,7 @@ def move_images_bulk(
 
     db.commit()
     if database.main_event_loop:
-        asyncio.run_coroutine_threadsafe(
-            manager.broadcast_json({"type": "refresh_images", "reason": "images_moved"}),
-            database.main_event_loop
-        )
+        manager.queue_broadcast_json({"type": "refresh_images", "reason": "images_moved"})
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
                 db=db,
@@ -500,7 +550,7 @@ def restore_image(
     # Broadcast a generic refresh message. Clients can refetch to see the restored image.
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "image_restored", "image_id": image_id}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -551,7 +601,7 @@ def permanently_delete_image(
     # The 'image_deleted' websocket message is already handled by the frontend, so we can reuse it.
     if database.main_event_loop:
         message = {"type": "image_deleted", "image_id": image_id}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -588,25 +638,28 @@ def empty_trash(
     if not current_user.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can empty the trash.")
 
-    trashed_locations = db.query(models.ImageLocation).filter(models.ImageLocation.deleted == True).all()
+    trashed_locations = db.query(
+        models.ImageLocation.id, models.ImageLocation.path, models.ImageLocation.filename
+    ).filter(models.ImageLocation.deleted == True).all()
 
     if not trashed_locations:
         return # Nothing to do
 
-    for location in trashed_locations:
-        full_path = os.path.join(location.path, location.filename)
-        try:
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                print(f"Permanently deleted file: {full_path}")
-        except OSError as e:
-            print(f"Error deleting file {full_path}: {e}")
-            # Decide if you want to stop or continue. For now, we continue.
-        
-        image_processor.remove_fts_entry(db, location.id)
-        db.delete(location)
-    
+    trashed_ids = [location.id for location in trashed_locations]
+
+    # Remove the FTS entries and location records in bulk instead of row by row
+    image_processor.remove_fts_entries(db, trashed_ids)
+    db.query(models.ImageLocation).filter(
+        models.ImageLocation.id.in_(trashed_ids)
+    ).delete(synchronize_session=False)
     db.commit()
+
+    # Disk I/O is the bottleneck here, so unlink the files in parallel
+    full_paths = [os.path.join(location.path, location.filename) for location in trashed_locations]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FILE_DELETE_WORKERS) as executor:
+        list(executor.map(_try_unlink, full_paths))
+    print(f"Permanently deleted {len(full_paths)} trashed files.")
+
     if database.main_event_loop:
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -639,7 +692,7 @@ def restore_trashed_images(
     # Broadcast a generic refresh message. Clients can refetch to see the restored images.
     if database.main_event_loop:
         message = {"type": "refresh_images", "reason": "images_restored", "image_ids": image_ids}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
@@ -686,7 +739,7 @@ def permanently_delete_trashed_images(
 
     if database.main_event_loop:
         message = {"type": "images_deleted", "image_ids": image_ids}
-        asyncio.run_coroutine_threadsafe(manager.broadcast_json(message), database.main_event_loop)
+        manager.queue_broadcast_json(message)
 
         asyncio.run_coroutine_threadsafe(
             manager.send_toast_and_log(
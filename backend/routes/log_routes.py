@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import base64, binascii, json
 
 import schemas
 import models
@@ -14,14 +16,44 @@ router = APIRouter(
     dependencies=[Depends(get_current_admin_user)] # Admin only
 )
 
+# --- Pagination Cursors ---
+# Pages are seeked by id instead of OFFSET. Ids increase in insertion order, so
+# id order matches timestamp order, and unlike the timestamp (stored as text
+# with second precision) the id is unique and compares reliably.
+
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
 @router.get("/", response_model=schemas.PaginatedLogs)
-def get_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_logs(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor."),
+    db: Session = Depends(get_db)
+):
     """
     Retrieve a paginated list of log entries, newest first.
+    Pass the returned next_cursor to fetch the following page.
     """
-    total = db.query(models.Log).count()
-    logs = db.query(models.Log).order_by(models.Log.timestamp.desc()).offset(skip).limit(limit).all()
-    return {"logs": logs, "total": total}
+    total = db.query(models.LogCount.value).filter(models.LogCount.id == 1).scalar() or 0
+    query = db.query(models.Log).order_by(models.Log.id.desc())
+    if cursor:
+        query = query.filter(models.Log.id < _decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+    # Fetch one extra row to tell whether another page exists
+    logs = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = _encode_cursor(logs[-1].id)
+    return {"logs": logs, "total": total, "next_cursor": next_cursor}
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_logs(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
@@ -29,7 +61,9 @@ async def clear_logs(db: Session = Depends(get_db), current_user: models.User =
     Deletes all log entries from the database.
     """
     try:
-        num_rows_deleted = db.query(models.Log).delete()
+        num_rows_deleted = db.execute(delete(models.Log).execution_options(synchronize_session=False)).rowcount
+        # The bulk delete skips the ORM events that maintain the counter
+        db.query(models.LogCount).filter(models.LogCount.id == 1).update({models.LogCount.value: 0})
         db.commit()
         
         # Send a toast notification to the admin who cleared the logs
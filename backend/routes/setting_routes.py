@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -6,6 +7,7 @@ import auth
 import database
 import models
 import schemas
+import settings_cache
 
 router = APIRouter()
 
@@ -33,12 +35,29 @@ def read_settings(
 def update_setting(setting_id: int, setting: schemas.SettingUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
     # Updates an existing global setting. Only accessible by admin users.
 
-    db_setting = db.query(models.Setting).filter(models.Setting.id == setting_id).first()
-    if db_setting is None:
-        raise HTTPException(status_code=404, detail="Setting not found")
-
-    for key, value in setting.dict(exclude_unset=True).items():
-        setattr(db_setting, key, value)
-    db.commit()
-    db.refresh(db_setting)
-    return db_setting
+    values = setting.model_dump(exclude_unset=True)
+    if values and db.get_bind().dialect.update_returning:
+        # Single UPDATE ... RETURNING instead of SELECT, UPDATE and a refresh SELECT
+        db_setting = db.execute(
+            update(models.Setting).where(models.Setting.id == setting_id).values(**values).returning(models.Setting)
+        ).scalar_one_or_none()
+        if db_setting is None:
+            raise HTTPException(status_code=404, detail="Setting not found")
+
+        # Serialize before the commit expires the instance, which would trigger another SELECT
+        response = schemas.Setting.model_validate(db_setting)
+        db.commit()
+    else:
+        # Backends without UPDATE ... RETURNING (MySQL, SQLite before 3.35) go through the ORM
+        db_setting = db.get(models.Setting, setting_id)
+        if db_setting is None:
+            raise HTTPException(status_code=404, detail="Setting not found")
+
+        for key, value in values.items():
+            setattr(db_setting, key, value)
+        db.commit()
+        db.refresh(db_setting)
+        response = schemas.Setting.model_validate(db_setting)
+    # A rename leaves the old name cached, so drop everything in that case
+    settings_cache.invalidate(None if 'name' in values else response.name)
+    return response
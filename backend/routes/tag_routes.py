@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import Response
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 
@@ -6,6 +8,8 @@ import auth
 import database
 import models
 import schemas
+import search_handler
+import settings_cache
 
 router = APIRouter()
 
@@ -17,15 +21,15 @@ def create_tag(tag: schemas.TagCreate, db: Session = Depends(database.get_db), c
     # Protection depends on the 'allow_tag_create' setting and user's admin status.
 
     # Check if general user tag creation is allowed
-    allow_tag_create_setting = db.query(models.Setting).filter_by(name='allow_tag_create').first()
-    if allow_tag_create_setting and allow_tag_create_setting.value.lower() != 'true':
+    allow_tag_create = settings_cache.get_cached_flag(db, 'allow_tag_create')
+    if allow_tag_create is False:
         if not current_user.admin:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Tag creation is currently disabled for non-admin users."
             )
 
-    db_tag = models.Tag(**tag.dict())
+    db_tag = models.Tag(**tag.model_dump())
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
@@ -40,25 +44,30 @@ def read_tags(
     # retrieves a list of tags.
     # If ID is None, returns all tags filtered by admin_only if non-admin
     if not imageId:
-        tags = db.query(models.Tag).filter_by(internal=False)
-
+        conditions = [models.Tag.internal == False]
         if not current_user.admin:
-            tags = tags.filter_by(admin_only=False)
+            conditions.append(models.Tag.admin_only == False)
+        tags = db.execute(select(models.Tag).where(*conditions)).scalars().all()
 
     else:
-        tags = db.query(models.Tag)\
-            .join(models.ImageContent.tags)\
-            .join(models.ImageLocation, models.ImageLocation.content_hash == models.ImageContent.content_hash)\
-            .filter(models.ImageLocation.id == imageId)\
-            .all()
-
-    return tags
+        # A location has exactly one content row and image_tags is keyed on (image_id, tag_id),
+        # so this join can't produce duplicate tags and needs no DISTINCT.
+        tags = db.execute(
+            select(models.Tag)
+            .join(models.Tag.images)
+            .join(models.ImageLocation, models.ImageLocation.content_hash == models.ImageContent.content_hash)
+            .where(models.ImageLocation.id == imageId)
+        ).scalars().all()
+
+    # Validate and serialize the whole list in one pass instead of going through FastAPI's per-item encoder
+    tag_models = schemas.TagListAdapter.validate_python(tags, from_attributes=True)
+    return Response(content=schemas.TagListAdapter.dump_json(tag_models), media_type="application/json")
 
 @router.get("/tags/{tag_id}", response_model=schemas.Tag)
 def read_tag(tag_id: int, db: Session = Depends(database.get_db)):
     # Retrieves a single tag by ID. Accessible by all.
 
-    db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+    db_tag = db.get(models.Tag, tag_id)
     if db_tag is None:
         raise HTTPException(status_code=404, detail="Tag not found")
     return db_tag
@@ -69,28 +78,45 @@ def update_tag(tag_id: int, tag: schemas.TagUpdate, db: Session = Depends(databa
     # Protection depends on the 'allow_tag_edit' setting and user's admin status.
 
     # Check if general user tag editing is allowed
-    allow_tag_edit_setting = db.query(models.Setting).filter_by(name='allow_tag_edit').first()
-    if allow_tag_edit_setting and allow_tag_edit_setting.value.lower() != 'true':
+    allow_tag_edit = settings_cache.get_cached_flag(db, 'allow_tag_edit')
+    if allow_tag_edit is False:
         if not current_user.admin:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Tag editing is currently disabled for non-admin users."
             )
 
-    db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
-    if db_tag is None:
-        raise HTTPException(status_code=404, detail="Tag not found")
-    for key, value in tag.dict(exclude_unset=True).items():
-        setattr(db_tag, key, value)
-    db.commit()
-    db.refresh(db_tag)
-    return db_tag
+    values = tag.model_dump(exclude_unset=True)
+    if values and db.get_bind().dialect.update_returning:
+        # Single UPDATE ... RETURNING instead of SELECT, UPDATE and a refresh SELECT
+        db_tag = db.execute(
+            update(models.Tag).where(models.Tag.id == tag_id).values(**values).returning(models.Tag)
+        ).scalar_one_or_none()
+        if db_tag is None:
+            raise HTTPException(status_code=404, detail="Tag not found")
+        # Serialize before the commit expires the instance, which would trigger another SELECT
+        response = schemas.Tag.model_validate(db_tag)
+        db.commit()
+    else:
+        # Backends without UPDATE ... RETURNING (MySQL, SQLite before 3.35) go through the ORM
+        db_tag = db.get(models.Tag, tag_id)
+        if db_tag is None:
+            raise HTTPException(status_code=404, detail="Tag not found")
+        for key, value in values.items():
+            setattr(db_tag, key, value)
+        db.commit()
+        db.refresh(db_tag)
+        response = schemas.Tag.model_validate(db_tag)
+    # Bulk UPDATEs skip the ORM events, so tell the search handler directly
+    if values:
+        search_handler.invalidate_filter_cache()
+    return response
 
 @router.delete("/tags/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_tag(tag_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
     # Deletes a tag. Only accessible by admin users.
 
-    db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+    db_tag = db.get(models.Tag, tag_id)
     if db_tag is None:
         raise HTTPException(status_code=404, detail="Tag not found")
     db.delete(db_tag)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from typing import List, Optional, Any, Dict
 from datetime import datetime
 
@@ -46,6 +46,9 @@ class Tag(TagBase):
     id: int
     model_config = ConfigDict(from_attributes=True) # Directly use ConfigDict
 
+# Serializer for tag lists, built once instead of per request
+TagListAdapter = TypeAdapter(List[Tag])
+
 # --- ImagePath Schemas ---
 class ImagePathBase(BaseModel):
     path: str
@@ -128,9 +131,13 @@ class ImageGridResponse(BaseModel):
     is_video: bool = False
     thumbnail_url: Optional[str] = None
     thumbnail_missing: Optional[bool] = False
+    cursor: Optional[str] = None # Set on the last item of a page for fetching the next one
 
     model_config = ConfigDict(from_attributes=True, extra='ignore')
 
+# Serializer for grid pages, built once instead of per request
+ImageGridListAdapter = TypeAdapter(List[ImageGridResponse])
+
 class ImageResponse(BaseModel):
     # Fields from ImageLocation
     id: int
@@ -262,6 +269,7 @@ class Log(LogBase):
 class PaginatedLogs(BaseModel):
     logs: List[Log]
     total: int
+    next_cursor: Optional[str] = None
 # --- Token Schema for Authentication ---
 class Token(BaseModel):
     access_token: str
@@ -1,207 +1,511 @@
-import shlex, json, re
+import json, re, threading, logging, functools
+import orjson
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, NamedTuple
+from sqlalchemy import event, select, union_all, literal
+from sqlalchemy.orm import Session, object_session
 import models
 
+logger = logging.getLogger(__name__)
+
+# --- FTS Expression Cache ---
+# The final FTS expression only depends on the user query, the requested filter
+# stages and the filter definitions themselves. Scrolling the grid repeats the
+# same combination for every page, so the built expression is memoized in a
+# small LRU. The filter version is part of the key and is bumped whenever a
+# filter (or a tag referenced by one) changes, so stale entries are never hit.
+FTS_EXPRESSION_CACHE_SIZE = 256
+_fts_expression_cache: "OrderedDict[tuple, Optional[str]]" = OrderedDict()
+_fts_expression_lock = threading.Lock()
+_filters_version = 0
+
+# FTS columns copied straight from the Sui parameters, as (column, Sui key)
+_SUI_COLUMNS = (
+    ("prompt", "prompt"), ("negative_prompt", "negativeprompt"),
+    ("model", "model"), ("sampler", "sampler"), ("scheduler", "scheduler"),
+    ("upscaler", "upscaler"),
+)
+# Column values for images without Sui parameters
+_NO_SUI_COLUMNS = {**{column: None for column, _ in _SUI_COLUMNS}, "loras": "", "application": "Unknown"}
+
 def flatten_exif_to_fts(location_id, path, filename, exif_json, tags=""):
     """Parses raw EXIF into a flat dictionary for FTS indexing."""
     # Extract Sui parameters if they exist
     params_str = exif_json.get("parameters", "{}")
-    try:
-        params = json.loads(params_str) if isinstance(params_str, str) else params_str
-    except:
+    if isinstance(params_str, dict):
+        params = params_str
+    elif isinstance(params_str, str) and "sui_image_params" not in params_str:
+        # Only the Sui block is read from the parameters, so images from other tools
+        # (A1111-style text, ComfyUI graphs) skip the JSON decode entirely.
         params = {}
-    sui = params.get("sui_image_params", {})
+    else:
+        try:
+            params = orjson.loads(params_str)
+        except orjson.JSONDecodeError:
+            # orjson is strict about NaN/Infinity and huge integers, which the stdlib parser
+            # (and so older metadata writers) accept; fall back before giving up.
+            try:
+                params = json.loads(params_str)
+            except (json.JSONDecodeError, TypeError):
+                params = {}
+    sui = params.get("sui_image_params", {}) if isinstance(params, dict) else {}
+    if not isinstance(sui, dict):
+        sui = {}
 
-    # Recursive helper for 'full_text' catch-all
-    def flatten(x):
-        if isinstance(x, dict): return " ".join(flatten(v) for v in x.values())
-        if isinstance(x, list): return " ".join(flatten(i) for i in x)
-        return str(x)
+    # Collects every leaf value for the 'full_text' catch-all. Walks an explicit stack
+    # into one list that is joined once, instead of joining a new string per level.
+    # Children are pushed in reverse so leaves come out in document order.
+    # EXIF comes from json.loads, so only exact dicts/lists occur (tuples are accepted too,
+    # for metadata that hasn't been through JSON); an identity check on the type is cheaper
+    # than isinstance walking the MRO for every leaf value. Strings, the most common leaf,
+    # skip str() entirely.
+    def flatten(root):
+        out = []
+        stack = [root]
+        while stack:
+            x = stack.pop()
+            t = type(x)
+            if t is str: out.append(x)
+            elif t is dict: stack.extend(reversed(x.values()))
+            elif t is list or t is tuple: stack.extend(reversed(x))
+            else: out.append(str(x))
+        return " ".join(out)
 
-    return {
+    row = {
         "location_id": location_id,
         "path": path,
         "filename": filename,
-        "prompt": sui.get("prompt"),
-        "negative_prompt": sui.get("negativeprompt"),
-        "model": sui.get("model"),
-        "sampler": sui.get("sampler"),
-        "scheduler": sui.get("scheduler"),
-        "loras": str(sui.get("loras", "")),
-        "upscaler": sui.get("upscaler"),
-        "application": "SwarmUI" if "swarm_version" in sui else "Unknown",
         "tags": tags,
         "stub": "1",
         "full_text": flatten(exif_json) + " " + tags
     }
+    if sui:
+        row.update({column: sui.get(key) for column, key in _SUI_COLUMNS})
+        row["loras"] = str(sui.get("loras", ""))
+        row["application"] = "SwarmUI" if "swarm_version" in sui else "Unknown"
+    else:
+        # Most images carry no Sui block, so their columns come from a prebuilt default
+        row.update(_NO_SUI_COLUMNS)
+    return row
+
+# Matches quoted phrases (left untouched) and bare | & ! operators, which get padded with spaces.
+# Compiled once at import instead of going through re's pattern cache on every query.
+_OPERATOR_SPACING_RE = re.compile(r'("[^"]*"|\'[^\']*\'|[|&!])')
+
+# Anything that needs the full tokenizer: quotes, escapes, operator symbols, NEAR(),
+# column prefixes, a word starting with '-' (shorthand NOT) or '*', or a '*' anywhere
+# but the end of a word. A single trailing '*' (prefix search) is handled by the fast path.
+_NEEDS_TOKENIZER_RE = re.compile(r'["\'\\|&!():]|(?:^|[ \t\r\n])[-*]|\*(?=[^ \t\r\n])')
+# The characters _split_fts splits on, so the fast path produces the same words
+_SHLEX_WHITESPACE_RE = re.compile(r'[ \t\r\n]+')
+_FTS_WHITESPACE = ' \t\r\n'
+
+# Search shorthand prefixes and the FTS5 columns they map to
+_COLUMN_PREFIXES = (
+    ("PROMPT:", "prompt:"), ("NEG:", "negative_prompt:"),
+    ("MODEL:", "model:"), ("APP:", "application:"),
+    ("FOLDER:", "path:"), ("PATH:", "path:"),
+    ("TAG:", "tags:"),
+    ("FILENAME:", "filename:"),
+)
+# One case-insensitive regex probe per word finds any of the prefixes above. Each
+# prefix is its own group, so the matched group number picks the column.
+_COLUMN_PREFIX_RE = re.compile("|".join(f"({re.escape(prefix)})" for prefix, _ in _COLUMN_PREFIXES), re.IGNORECASE)
+_COLUMN_BY_GROUP = {i: col for i, (_, col) in enumerate(_COLUMN_PREFIXES, start=1)}
+
+# Symbols and FTS5 reserved keywords (which must be uppercase to be recognized
+# as operators), keyed by the uppercased token so one lookup handles both.
+_OPERATOR_TOKENS = {
+    "|": "OR", "&": "AND", "!": "NOT",
+    "AND": "AND", "OR": "OR", "NOT": "NOT", "NEAR": "NEAR",
+}
+
+def _split_fts(s: str):
+    """
+    Splits a search query into words in one pass, keeping "quoted phrases" together.
+    Follows shlex.split's POSIX rules (quotes join onto the surrounding word, backslash
+    escapes outside single quotes) without its per-character state machine.
+    Falls back to a plain whitespace split for unclosed quotes or a trailing backslash.
+    """
+    parts = []
+    token = []
+    in_token = False # Distinguishes an empty quoted string ("") from no token at all
+    i, n = 0, len(s)
+    while i < n:
+        c = s[i]
+        if c in _FTS_WHITESPACE:
+            if in_token:
+                parts.append("".join(token))
+                token.clear()
+                in_token = False
+            i += 1
+        elif c == '"' or c == "'":
+            end = i + 1
+            chunk = []
+            while True:
+                if end >= n:
+                    return s.split() # No closing quotation
+                ch = s[end]
+                if ch == c:
+                    break
+                if ch == '\\' and c == '"':
+                    if end + 1 >= n:
+                        return s.split()
+                    nxt = s[end + 1]
+                    # Inside double quotes a backslash only escapes a quote or another backslash
+                    if nxt == '"' or nxt == '\\':
+                        chunk.append(nxt)
+                        end += 2
+                        continue
+                chunk.append(ch)
+                end += 1
+            token.extend(chunk)
+            in_token = True
+            i = end + 1
+        elif c == '\\':
+            if i + 1 >= n:
+                return s.split() # No escaped character
+            token.append(s[i + 1])
+            in_token = True
+            i += 2
+        else:
+            token.append(c)
+            in_token = True
+            i += 1
+    if in_token:
+        parts.append("".join(token))
+    return parts
+
+# The same words recur across many different queries ("cat", "-nsfw", "model:sdxl*"),
+# so each word's translation is memoized separately from the whole-query cache.
+@functools.lru_cache(maxsize=4096)
+def _translate_term(p: str) -> str:
+    """Translates one word from the user query into its FTS5 form."""
+    # Normalize symbols and Boolean keywords to FTS5 operators in one lookup
+    p_upper = p.upper()
+    operator = _OPERATOR_TOKENS.get(p_upper)
+    if operator:
+        return operator
+
+    # Handle NEAR() syntax specifically. We skip quoting logic if it's a NEAR function.
+    if p_upper.startswith("NEAR("):
+        return p
+
+    # Handle Shorthand NOT (e.g., -cat)
+    prefix_operator = ""
+    clean_p = p
+    if p.startswith('-') and len(p) > 1:
+        prefix_operator = "NOT "
+        clean_p = p[1:]
+
+    #  Handle Column-Specific Searches (e.g., MODEL:v1*)
+    target_col = ""
+    match = _COLUMN_PREFIX_RE.match(clean_p)
+    if match:
+        target_col = _COLUMN_BY_GROUP[match.lastindex]
+        clean_p = clean_p[match.end():]
+
+    # Handle Prefix Wildcard (*)
+    suffix_wildcard = ""
+    if clean_p.endswith('*') and len(clean_p) > 1:
+        suffix_wildcard = "*"
+        clean_p = clean_p[:-1]
 
-def build_fts_query(user_query: str):
+    return f'{prefix_operator}{target_col}"{clean_p}"{suffix_wildcard}'
+
+# Longest search a user can submit, in words and operators. Bounds the size of the
+# expression SQLite has to parse and plan for pathological input. Filter terms are
+# admin-defined (the default Explicit filter alone is longer) and are not capped.
+MAX_QUERY_TOKENS = 32
+_OPERATOR_VALUES = frozenset(_OPERATOR_TOKENS.values())
+
+# Filter search terms rarely change and the same user queries repeat while scrolling,
+# so translated queries are memoized. The result is an immutable string, safe to share.
+# Sized to hold every filter's terms plus a good working set of distinct user searches.
+FTS_QUERY_CACHE_SIZE = 1024
+@functools.lru_cache(maxsize=FTS_QUERY_CACHE_SIZE)
+def build_fts_query(user_query: str, max_tokens: Optional[int] = None):
     if not user_query:
         return None
 
-    mapping = {
-        "PROMPT:": "prompt:", "NEG:": "negative_prompt:", 
-        "MODEL:": "model:", "APP:": "application:", 
-        "FOLDER:": "path:", "PATH:": "path:",
-        "TAG:": "tags:",
-        "FILENAME:": "filename:"
-    }
+    # Fast path: most searches are just a few plain words, which need no tokenizer
+    if not _NEEDS_TOKENIZER_RE.search(user_query):
+        words = [w for w in _SHLEX_WHITESPACE_RE.split(user_query) if w]
+        if not any(w.upper() in _OPERATOR_TOKENS for w in words):
+            if max_tokens and len(words) > max_tokens:
+                logger.warning("Search query truncated to %d of %d words", max_tokens, len(words))
+                words = words[:max_tokens]
+            return " ".join(f'"{w[:-1]}"*' if w[-1] == "*" else f'"{w}"' for w in words)
 
-    # Map symbols to FTS5 keywords
-    symbols = {
-        "|": "OR",
-        "&": "AND",
-        "!": "NOT"
-    }
-    
-    # FTS5 Reserved Keywords (must be uppercase to be recognized as operators)
-    fts_keywords = {"AND", "OR", "NOT", "NEAR"}
+    # Pre-process to add spaces around operators (| & !), while ignoring them inside quotes.
+    # This allows 'fox|frog' to be split correctly into ['fox', '|', 'frog'].
+    user_query = _OPERATOR_SPACING_RE.sub(r' \1 ', user_query)
 
-    try:
-        # Pre-process to add spaces around operators (| & !), while ignoring them inside quotes.
-        # This allows 'fox|frog' to be split correctly into ['fox', '|', 'frog'].
-        user_query = re.sub(r'("[^"]*"|\'[^\']*\'|[|&!])', r' \1 ', user_query)
-        
-        # Using shlex to respect "quoted phrases"
-        parts = shlex.split(user_query)
-    except ValueError:
-        # Fallback for unclosed quotes
-        parts = user_query.split()
-
-    terms = []
-    for p in parts:
-        # Normalize symbols to operators
-        p_upper = p.upper()
-        if p_upper in symbols:
-            terms.append(symbols[p_upper])
-            continue
+    # Split into words, respecting "quoted phrases"
+    parts = _split_fts(user_query)
 
-        # Handle explicit Boolean Operators (fts_keywords)
-        if p.upper() in fts_keywords:
-            terms.append(p.upper())
-            continue
+    if max_tokens and len(parts) > max_tokens:
+        logger.warning("Search query truncated to %d of %d words", max_tokens, len(parts))
+        terms = [_translate_term(p) for p in parts[:max_tokens]]
+        # Don't leave a dangling operator where the query was cut off
+        while terms and terms[-1] in _OPERATOR_VALUES:
+            terms.pop()
+        return " ".join(terms) or None
 
-        # Handle NEAR() syntax specifically. We skip quoting logic if it's a NEAR function.
-        if p_upper.startswith("NEAR("):
-            terms.append(p)
-            continue
+    return " ".join(_translate_term(p) for p in parts)
+
+# Built once; the compiled forms are then served from the engine's statement cache.
+# Snapshots only need a few columns, so filters and their tag names are read as
+# plain rows (two queries in total) instead of loading Filter and Tag entities.
+_ALL_FILTERS_STMT = select(
+    models.Filter.id, models.Filter.search_terms,
+    models.Filter.main_stage, models.Filter.second_stage, models.Filter.third_stage,
+)
+_ALL_FILTER_TAG_NAMES_STMT = union_all(
+    select(models.filter_tags.c.filter_id, literal(False).label("negative"), models.Tag.name)
+        .join(models.Tag, models.Tag.id == models.filter_tags.c.tag_id),
+    select(models.filter_neg_tags.c.filter_id, literal(True).label("negative"), models.Tag.name)
+        .join(models.Tag, models.Tag.id == models.filter_neg_tags.c.tag_id),
+)
+
+def invalidate_filter_cache():
+    """Discards cached FTS expressions. Runs automatically after filter or tag changes are committed."""
+    global _filters_version
+    with _fts_expression_lock:
+        _filters_version += 1
+        _fts_expression_cache.clear()
+
+# Filter and tag writes flag the session they happen in; the cache is only
+# invalidated once that session commits, so rolled back changes cost nothing.
+def _mark_filters_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["filters_changed"] = True
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(models.Filter, _event_name, _mark_filters_changed)
+# Filters embed tag names in their expressions, so renamed or deleted tags count too
+for _event_name in ("after_update", "after_delete"):
+    event.listen(models.Tag, _event_name, _mark_filters_changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("filters_changed", False):
+        invalidate_filter_cache()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("filters_changed", None)
+
+def get_cached_fts_expression(db: Session, user_query: Optional[str], active_stages_json: Optional[str]):
+    """
+    Returns the FTS expression for a search/filter combination, building it
+    from the database filters only when it is not already cached.
+    """
+    # Requests without stage overrides all resolve to the filters' main stages,
+    # whichever way the client spelled "nothing"; give them a single cache entry.
+    if not active_stages_json or active_stages_json.strip() in ("null", "{}"):
+        active_stages_json = None
+    user_query = user_query or None
+
+    with _fts_expression_lock:
+        version = _filters_version
+        key = (user_query, active_stages_json, version)
+        if key in _fts_expression_cache:
+            _fts_expression_cache.move_to_end(key)
+            return _fts_expression_cache[key]
+
+    active_filters = get_active_filter_stages(get_filters_snapshot(db), active_stages_json)
+    expression = get_final_fts_expression(user_query, active_filters)
+
+    with _fts_expression_lock:
+        # Only store the result if no filter changed while it was being built.
+        if version == _filters_version:
+            _fts_expression_cache[key] = expression
+            if len(_fts_expression_cache) > FTS_EXPRESSION_CACHE_SIZE:
+                _fts_expression_cache.popitem(last=False)
+    return expression
+
+@dataclass(frozen=True, slots=True)
+class FilterSnapshot:
+    """The parts of a Filter row the expression builder needs, detached from the session."""
+    id: int
+    search_terms: Optional[str]
+    stages: tuple # (main_stage, second_stage, third_stage)
+    tag_names: tuple
+    neg_tag_names: tuple
 
-        # Handle Shorthand NOT (e.g., -cat)
-        prefix_operator = ""
-        clean_p = p
-        if p.startswith('-') and len(p) > 1:
-            prefix_operator = "NOT "
-            clean_p = p[1:]
-
-        #  Handle Column-Specific Searches (e.g., MODEL:v1*)
-        target_col = ""
-        upper_p = clean_p.upper()
-        for prefix, col in mapping.items():
-            if upper_p.startswith(prefix):
-                target_col = col
-                clean_p = clean_p[len(prefix):]
-                break
-
-        # Handle Prefix Wildcard (*)
-        suffix_wildcard = ""
-        if clean_p.endswith('*') and len(clean_p) > 1:
-            suffix_wildcard = "*"
-            clean_p = clean_p[:-1]
-
-        assembled = f'{prefix_operator}{target_col}"{clean_p}"{suffix_wildcard}'
-        terms.append(assembled)
-
-    return " ".join(terms)
-
-def get_active_filter_stages(db_filters: list[models.Filter], active_stages_json: str):
+_filters_snapshot: Optional[tuple] = None # (filters version, list of FilterSnapshot)
+
+def get_filters_snapshot(db: Session) -> list[FilterSnapshot]:
+    """
+    Returns all filters as plain snapshots, loading them from the database only
+    when the filters version has changed since the last load.
     """
-    db_filters: Result from your db.query(models.Filter).all()
+    global _filters_snapshot
+    with _fts_expression_lock:
+        version = _filters_version
+        snapshot = _filters_snapshot
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot[1]
+
+    tag_names = {} # (filter_id, negative) -> [tag names]
+    for filter_id, negative, name in db.execute(_ALL_FILTER_TAG_NAMES_STMT):
+        tag_names.setdefault((filter_id, bool(negative)), []).append(name)
+
+    filters = [
+        FilterSnapshot(
+            id=filter_id,
+            search_terms=search_terms,
+            stages=(main_stage, second_stage, third_stage),
+            tag_names=tuple(tag_names.get((filter_id, False), ())),
+            neg_tag_names=tuple(tag_names.get((filter_id, True), ())),
+        )
+        for filter_id, search_terms, main_stage, second_stage, third_stage in db.execute(_ALL_FILTERS_STMT)
+    ]
+
+    with _fts_expression_lock:
+        if version == _filters_version:
+            _filters_snapshot = (version, filters)
+    return filters
+
+class ActiveFilter(NamedTuple):
+    """A filter resolved to the action it takes for this request, detached from the ORM row."""
+    action: str # "hide" or "show_only"
+    search_terms: Optional[str]
+    tag_names: tuple
+    neg_tag_names: tuple
+
+
+def get_active_filter_stages(db_filters: list[FilterSnapshot], active_stages_json: str) -> list[ActiveFilter]:
+    """
+    db_filters: Result from get_filters_snapshot()
     active_stages_json: String like '{"1": 2, "5": 3}' from the frontend
     """
     try:
         # Parse frontend input: e.g., { "filter_id": stage_index }
-        stage_map = json.loads(active_stages_json) if active_stages_json else {}
-    except:
+        stage_map = orjson.loads(active_stages_json) if active_stages_json else {}
+    except orjson.JSONDecodeError:
+        logger.warning("Could not decode active_stages_json: %s", active_stages_json)
+        stage_map = {}
+    if not isinstance(stage_map, dict):
+        logger.warning("Ignoring active_stages_json that is not an object: %s", active_stages_json)
         stage_map = {}
 
+    # Convert the JSON object keys once so the loop can look filters up by their integer id
+    stage_by_id = {}
+    for key, stage_idx in stage_map.items():
+        try:
+            stage_by_id[int(key)] = stage_idx
+        except ValueError:
+            continue
+
     active_stages = []
 
     for f in db_filters:
-        current_stage_idx = stage_map.get(str(f.id), 0)
+        current_stage_idx = stage_by_id.get(f.id, 0)
 
         # Map the index to the actual action string stored in the DB
-        if current_stage_idx == 0:
-            action = f.main_stage
-        elif current_stage_idx == 1:
-            action = f.second_stage
-        elif current_stage_idx == 2:
-            action = f.third_stage
+        if isinstance(current_stage_idx, int) and 0 <= current_stage_idx < 3:
+            action = f.stages[current_stage_idx]
         else:
             action = "disabled"
 
         # Only include if the action is something that affects the query
-        if action in ["hide", "show_only"]:
-            # We attach the 'action' to the object temporarily so the 
-            # expression builder knows what to do with it.
-            f.current_action = action 
-            active_stages.append(f)
+        if action in ("hide", "show_only"):
+            active_stages.append(ActiveFilter(
+                action=action,
+                search_terms=f.search_terms,
+                tag_names=f.tag_names,
+                neg_tag_names=f.neg_tag_names,
+            ))
 
     return active_stages
 
 
-def get_final_fts_expression(user_query: str, active_configs: list[models.Filter]):
+def build_tags_clause(tag_names) -> str:
+    """
+    Matches any of the given tags with a single column filter, e.g. tags:("a" OR "b"),
+    so FTS5 resolves the whole set against the tags column in one group instead of
+    one column-qualified phrase per tag. A single tag is a plain column phrase.
+    """
+    if len(tag_names) == 1:
+        return f'tags:"{tag_names[0]}"'
+    return "tags:(" + " OR ".join(f'"{name}"' for name in tag_names) + ")"
+
+
+@functools.lru_cache(maxsize=256)
+def build_filter_clause(search_terms: Optional[str], tag_names: tuple, neg_tag_names: tuple) -> Optional[str]:
+    """
+    Builds the FTS fragment for one filter. Keyed on the filter's content rather than
+    its id, so an edited filter simply misses the cache and stale entries age out.
+    """
+    # Compile the filter's specific search terms
+    filter_logic = build_fts_query(search_terms)
+
+    # Combine with Positive Tags (Tags that trigger this filter)
+    if tag_names:
+        tag_str = build_tags_clause(tag_names)
+        filter_logic = f"({filter_logic} OR {tag_str})" if filter_logic else f"({tag_str})"
+
+    # Wrap with Negative Tags (Protection logic: "Filter BUT NOT if tagged X")
+    if neg_tag_names and filter_logic:
+        neg_tag_str = build_tags_clause(neg_tag_names)
+        filter_logic = f"({filter_logic} NOT ({neg_tag_str}))"
+
+    return filter_logic
+
+
+def get_final_fts_expression(user_query: str, active_configs: list[ActiveFilter]):
     """
     user_query: Raw search bar text
     active_configs: The hydrated list from get_active_filter_stages()
     Returns: query_string or None
     """
+    # Nothing to search for and no filter affects the results
+    if not user_query and not active_configs:
+        return None
+
     # Build the base user search (e.g., "cat")
-    base_fts = build_fts_query(user_query)
+    base_fts = build_fts_query(user_query, MAX_QUERY_TOKENS)
     
     hide_clauses = []
     show_only_clauses = []
 
     for f in active_configs:
-        # Compile the filter's specific search terms
-        filter_logic = build_fts_query(f.search_terms)
-        
-        # Combine with Positive Tags (Tags that trigger this filter)
-        if f.tags:
-            tag_str = " OR ".join([f'tags:"{t.name}"' for t in f.tags])
-            filter_logic = f"({filter_logic} OR {tag_str})" if filter_logic else f"({tag_str})"
-
-        # Wrap with Negative Tags (Protection logic: "Filter BUT NOT if tagged X")
-        if f.neg_tags:
-            neg_tag_str = " OR ".join([f'tags:"{t.name}"' for t in f.neg_tags])
-            filter_logic = f"({filter_logic} NOT ({neg_tag_str}))"
+        filter_logic = build_filter_clause(f.search_terms, f.tag_names, f.neg_tag_names)
 
         if not filter_logic:
             continue
 
         # Categorize based on the determined action
-        if f.current_action == "hide":
+        if f.action == "hide":
             hide_clauses.append(filter_logic)
-        elif f.current_action == "show_only":
+        elif f.action == "show_only":
             show_only_clauses.append(filter_logic)
 
+    # Filters with the same terms and tags build the same fragment (it is cached on
+    # content); repeating it only lengthens the expression, so keep the first of each.
+    hide_clauses = list(dict.fromkeys(hide_clauses))
+    show_only_clauses = list(dict.fromkeys(show_only_clauses))
+
     # Build Positive Query Components
-    positive_parts = []
-    if base_fts:
-        positive_parts.append(base_fts)
-    
-    for c in show_only_clauses:
-        positive_parts.append(c)
+    positive_parts = [base_fts] if base_fts else []
+    positive_parts.extend(show_only_clauses)
 
     # If no positive parts exist but we have exclusions, use the dummy anchor
     if not positive_parts and hide_clauses:
         positive_parts.append('stub:"1"')
 
-    # Assemble Final Query
-    if positive_parts:
-        # We have a positive anchor (User query OR Show Only filters OR Dummy)
-        final_query = " AND ".join(f"({p})" for p in positive_parts)
-        
-        for c in hide_clauses:
-            final_query = f"({final_query}) NOT ({c})"
-        return final_query
-        
-    return None
\ No newline at end of file
+    if not positive_parts:
+        return None
+
+    # Assemble Final Query in one pass over a list of pieces, joined once.
+    # We have a positive anchor (User query OR Show Only filters OR Dummy).
+    # P NOT h1 NOT h2 ... is P NOT (h1 OR h2 ...): one flat exclusion group
+    # instead of a NOT nested once per hide filter.
+    pieces = ["(", ") AND (".join(positive_parts), ")"]
+    if hide_clauses:
+        pieces = ["(", *pieces, ") NOT ((", ") OR (".join(hide_clauses), "))"]
+    return "".join(pieces)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import threading, time
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+import models
+
+# --- Setting Value Cache ---
+# Permission checks and background workers read the same handful of settings on
+# every call, while the values only change when an admin edits them. Values are
+# cached per setting name for a short TTL, and update_setting invalidates the
+# entry right away so edits take effect immediately in this process.
+SETTINGS_CACHE_TTL = 60 # seconds
+_settings_cache: Dict[Tuple[str, str], Tuple[Any, float]] = {} # (name, kind) -> (value, expiry)
+_settings_lock = threading.Lock()
+
+def _get_cached(name: str, kind: str, load: Callable[[], Any]):
+    now = time.monotonic()
+    key = (name, kind)
+    with _settings_lock:
+        cached = _settings_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    value = load()
+
+    with _settings_lock:
+        _settings_cache[key] = (value, now + SETTINGS_CACHE_TTL)
+    return value
+
+def get_cached_setting(db: Session, name: str) -> Optional[str]:
+    """Returns the value of the named setting, or None if it doesn't exist."""
+    return _get_cached(name, "value", lambda: db.execute(
+        select(models.Setting.value).where(models.Setting.name == name)
+    ).scalar())
+
+def get_cached_flag(db: Session, name: str) -> Optional[bool]:
+    """
+    Returns whether a switch setting is 'true' (case-insensitive), or None if it doesn't exist.
+    The comparison runs in SQL, so only a boolean comes back from the database.
+    """
+    return _get_cached(name, "flag", lambda: db.execute(
+        select(func.lower(models.Setting.value) == 'true').where(models.Setting.name == name)
+    ).scalar())
+
+def invalidate(name: Optional[str] = None):
+    """Drops the cached values for one setting, or for all settings if no name is given."""
+    with _settings_lock:
+        if name is None:
+            _settings_cache.clear()
+        else:
+            for key in [key for key in _settings_cache if key[0] == name]:
+                del _settings_cache[key]
@@ -0,0 +1,76 @@
+import os, sys, json, tempfile, unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+# Point the app at a throwaway database before config is imported
+_work_dir = tempfile.mkdtemp()
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{_work_dir}/pagination.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import models
+from routes import image_routes
+
+IMAGE_DIR = "/images"
+IMAGE_COUNT = 25
+PAGE_SIZE = 4
+
+
+class ImagePaginationTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        models.Base.metadata.create_all(bind=database.engine)
+        db = database.SessionLocal()
+        db.add(models.ImagePath(path=IMAGE_DIR, short_name="images", admin_only=False))
+        # Only three distinct dates, so every page boundary falls inside a run of equal sort values
+        for i in range(IMAGE_COUNT):
+            content_hash = f"hash{i:03d}"
+            db.add(models.ImageContent(content_hash=content_hash, date_created=datetime(2024, 1, 1 + i % 3)))
+            db.add(models.ImageLocation(content_hash=content_hash, filename=f"img{i:03d}.png", path=IMAGE_DIR))
+        db.commit()
+        db.close()
+
+    def setUp(self):
+        self.db = database.SessionLocal()
+        self.user = SimpleNamespace(admin=True)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _page(self, sort_by, sort_order, cursor):
+        response = image_routes.read_images(
+            limit=PAGE_SIZE, search_query=None, sort_by=sort_by, sort_order=sort_order, cursor=cursor,
+            db=self.db, active_stages_json=None, trash_only=False, current_user=self.user,
+        )
+        return json.loads(response.body)
+
+    def _walk(self, sort_by, sort_order):
+        ids, cursor = [], None
+        while True:
+            page = self._page(sort_by, sort_order, cursor)
+            if not page:
+                return ids
+            ids.extend(image["id"] for image in page)
+            cursor = page[-1]["cursor"]
+
+    def test_pages_cover_every_image_once(self):
+        for sort_by in ("date_created", "filename"):
+            for sort_order in ("asc", "desc"):
+                with self.subTest(sort_by=sort_by, sort_order=sort_order):
+                    ids = self._walk(sort_by, sort_order)
+                    self.assertEqual(len(ids), IMAGE_COUNT)
+                    self.assertEqual(len(set(ids)), IMAGE_COUNT)
+
+    def test_pages_match_a_single_unpaged_listing(self):
+        for sort_order in ("asc", "desc"):
+            with self.subTest(sort_order=sort_order):
+                response = image_routes.read_images(
+                    limit=IMAGE_COUNT, search_query=None, sort_by="date_created", sort_order=sort_order, cursor=None,
+                    db=self.db, active_stages_json=None, trash_only=False, current_user=self.user,
+                )
+                expected = [image["id"] for image in json.loads(response.body)]
+                self.assertEqual(self._walk("date_created", sort_order), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
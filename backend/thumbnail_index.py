@@ -0,0 +1,78 @@
+import os, threading, hashlib
+import config
+
+# --- Thumbnail Bloom Filter ---
+# Listing images checks for a thumbnail on disk for every row. The set of
+# content hashes that already have a thumbnail is kept in a Bloom filter, so a
+# negative answer ("definitely no thumbnail") needs no filesystem access at all.
+# A positive answer may be a false positive and is confirmed with a single stat.
+# Until the filter has been warmed from the thumbnails directory every lookup
+# falls back to the filesystem.
+THUMB_SUFFIX = "_thumb.webp"
+BLOOM_SIZE_BITS = 1 << 23 # 1 MB, ~1% false positives at roughly 850k thumbnails
+BLOOM_NUM_HASHES = 7
+
+class ThumbnailBloomFilter:
+    def __init__(self, size_bits: int = BLOOM_SIZE_BITS, num_hashes: int = BLOOM_NUM_HASHES):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self._bits = bytearray(size_bits // 8)
+        self._lock = threading.Lock() # Guards bit updates; lookups read without locking
+        self.ready = False
+
+    def _positions(self, key: str):
+        # Content hashes are already SHA256 hex digests, so their bits are used directly.
+        # Anything else is hashed first. Positions use double hashing: h1 + i * h2.
+        try:
+            if len(key) < 32:
+                raise ValueError
+            h1, h2 = int(key[:16], 16), int(key[16:32], 16)
+        except ValueError:
+            digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+            h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        h2 |= 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        positions = self._positions(key)
+        with self._lock:
+            bits = self._bits
+            for pos in positions:
+                bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def clear(self):
+        with self._lock:
+            self._bits = bytearray(self.size_bits // 8)
+
+    def warm(self, directory: str):
+        # Adds every thumbnail currently on disk. Thumbnails generated while this
+        # runs are added to the same bit array, so nothing is lost.
+        count = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(THUMB_SUFFIX):
+                        self.add(entry.name[:-len(THUMB_SUFFIX)])
+                        count += 1
+        except FileNotFoundError:
+            pass # No thumbnails generated yet
+        except OSError as e:
+            print(f"Error warming thumbnail index from {directory}: {e}")
+            return
+        self.ready = True
+        print(f"Thumbnail index warmed with {count} thumbnails.")
+
+thumbnail_bloom = ThumbnailBloomFilter()
+
+def warm_thumbnail_index():
+    thumbnail_bloom.warm(str(config.THUMBNAILS_DIR))
+
+def thumbnail_exists(content_hash: str, thumbnail_path: str) -> bool:
+    # Returns whether the thumbnail for content_hash exists, skipping the stat when the filter rules it out.
+    if thumbnail_bloom.ready and not thumbnail_bloom.might_contain(content_hash):
+        return False
+    return os.path.exists(thumbnail_path)
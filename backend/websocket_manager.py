@@ -1,10 +1,26 @@
-import json
-from typing import List, Dict, Optional
+import orjson, logging
+from typing import List, Dict, Optional, Sequence, Tuple
 import asyncio
 from fastapi import WebSocket, Depends, WebSocketDisconnect
 
 from sqlalchemy.orm import Session
 import models
+import database
+
+# Connection churn and broadcasts are frequent, so they log at DEBUG with lazy
+# formatting; nothing is formatted or written unless that level is enabled.
+logger = logging.getLogger(__name__)
+
+# Upper bound on log entries waiting to be written; send_toast_and_log waits for room beyond this
+LOG_QUEUE_SIZE = 10000
+# Most log entries written in one transaction
+LOG_BATCH_SIZE = 500
+
+# The exact keep-alive frame the frontend sends (JSON.stringify({ type: 'ping' }))
+PING_FRAME = '{"type":"ping"}'
+# Fixed messages, encoded once at import rather than on every send
+PONG_FRAME = orjson.dumps({"type": "pong"}).decode()
+REFRESH_BATCH_FRAME = orjson.dumps({"type": "refresh_images", "reason": "batch_update"}).decode()
 
 class WebSocketManager:
     def __init__(self):
@@ -14,47 +30,144 @@ class WebSocketManager:
         self.user_connections: Dict[int, List[WebSocket]] = {}
         # Connections for authenticated admin users
         self.admin_connections: Dict[int, List[WebSocket]] = {}
+        # Flat views of the groups above, kept in step on connect/disconnect so
+        # broadcasts don't rebuild them from the per-user dicts every time. They are
+        # tuples replaced on every change, so a broadcast can hold one as a stable
+        # snapshot without copying it, however sockets come and go during the sends.
+        self._all_ws: Tuple[WebSocket, ...] = ()
+        self._authed_ws: Tuple[WebSocket, ...] = () # Admins and non-admin users
+        self._admin_ws: Tuple[WebSocket, ...] = ()
         # Debouncing state
-        self.public_debounce_task: Optional[asyncio.Task] = None
-        self.admin_debounce_task: Optional[asyncio.Task] = None
+        # Pending refresh timers; None when nothing is scheduled
+        self._public_refresh_timer: Optional[asyncio.TimerHandle] = None
+        self._admin_refresh_timer: Optional[asyncio.TimerHandle] = None
+        self._refresh_tasks: set = set() # Keeps fired refresh sends referenced until they finish
         self.debounce_delay: float = 1.5  # seconds
+        # Outbox for broadcasts queued from worker threads, drained by a single task on the main loop
+        self._outbox: Optional[asyncio.Queue] = None
+        self._outbox_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox_task: Optional[asyncio.Task] = None
+        # Write-behind queue for toast log entries, drained in batches by a single task
+        self._log_queue: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
+
+    def start_outbox(self, loop: asyncio.AbstractEventLoop):
+        # Creates the broadcast outbox and its drain task. Must be called from within the running loop.
+        self._outbox = asyncio.Queue()
+        self._outbox_loop = loop
+        self._outbox_task = loop.create_task(self._drain_outbox())
+        self._log_queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._log_task = loop.create_task(self._drain_log_queue())
+
+    def stop_outbox(self):
+        if self._outbox_task:
+            self._outbox_task.cancel()
+        self._outbox_task = None
+        self._outbox = None
+        self._outbox_loop = None
+        if self._log_task:
+            self._log_task.cancel()
+        self._log_task = None
+        # Write whatever is still queued before shutting down
+        if self._log_queue is not None:
+            pending = []
+            while not self._log_queue.empty():
+                pending.append(self._log_queue.get_nowait())
+            self._log_queue = None
+            if pending:
+                self._write_logs(pending)
+
+    @staticmethod
+    def _write_logs(entries: List[dict]):
+        # Inserts a batch of log entries in one transaction. Runs in a worker thread.
+        # Entries go through the ORM so the LogCount listener counts the whole batch.
+        db = database.SessionLocal()
+        try:
+            db.add_all([models.Log(**entry) for entry in entries])
+            db.commit()
+        except Exception as e:
+            logger.error("Failed to write %d log entries: %s", len(entries), e)
+            db.rollback()
+        finally:
+            db.close()
+
+    async def _drain_log_queue(self):
+        # Takes everything queued so far (up to a batch) and writes it off the event loop.
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._log_queue.get()]
+            while len(batch) < LOG_BATCH_SIZE and not self._log_queue.empty():
+                batch.append(self._log_queue.get_nowait())
+            await loop.run_in_executor(None, self._write_logs, batch)
+
+    async def _drain_outbox(self):
+        # Sends queued messages to all clients, one at a time, in the order they were queued.
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self.broadcast_json(message)
+            except Exception as e:
+                logger.error("Error broadcasting queued message: %s", e)
+
+    def queue_broadcast_json(self, message: dict):
+        """
+        Queues a message to be broadcast to all connected clients.
+        Safe to call from any thread. Unlike run_coroutine_threadsafe, no Future
+        is created, so sync routes and the file watcher don't pay for one per message.
+        """
+        if self._outbox is None or self._outbox_loop is None:
+            return
+        self._outbox_loop.call_soon_threadsafe(self._outbox.put_nowait, message)
+
+    def _unlist(self, websocket: WebSocket):
+        # Removes a socket from the flat broadcast lists.
+        if websocket in self._all_ws:
+            self._all_ws = tuple(ws for ws in self._all_ws if ws is not websocket)
+        if websocket in self._authed_ws:
+            self._authed_ws = tuple(ws for ws in self._authed_ws if ws is not websocket)
+        if websocket in self._admin_ws:
+            self._admin_ws = tuple(ws for ws in self._admin_ws if ws is not websocket)
 
     async def connect(self, websocket: WebSocket, user: Optional[models.User] = None):
         # Registers a new WebSocket connection.
+        self._all_ws += (websocket,)
         if user:
+            self._authed_ws += (websocket,)
             if user.admin:
+                self._admin_ws += (websocket,)
                 if user.id not in self.admin_connections:
                     self.admin_connections[user.id] = []
                 self.admin_connections[user.id].append(websocket)
-                print(f"Admin client connected: {user.username} ({websocket.client.host})")
+                logger.debug("Admin client connected: %s (%s)", user.username, websocket.client.host)
             else: # Non-admin user
                 if user.id not in self.user_connections:
                     self.user_connections[user.id] = []
                 self.user_connections[user.id].append(websocket)
-                print(f"User client connected: {user.username} ({websocket.client.host})")
+                logger.debug("User client connected: %s (%s)", user.username, websocket.client.host)
         else:
             self.anonymous_connections.append(websocket)
-            print(f"Anonymous client connected: {websocket.client.host}")
+            logger.debug("Anonymous client connected: %s", websocket.client.host)
 
     def disconnect(self, websocket: WebSocket, user: Optional[models.User] = None):
         # Removes a WebSocket connection.
+        self._unlist(websocket)
         if user:
             if user.admin and user.id in self.admin_connections:
                 if websocket in self.admin_connections[user.id]:
                     self.admin_connections[user.id].remove(websocket)
                 if not self.admin_connections[user.id]:
                     del self.admin_connections[user.id]
-                print(f"Admin client disconnected: {user.username} ({websocket.client.host})")
+                logger.debug("Admin client disconnected: %s (%s)", user.username, websocket.client.host)
             elif not user.admin and user.id in self.user_connections:
                 if websocket in self.user_connections[user.id]:
                     self.user_connections[user.id].remove(websocket)
                 if not self.user_connections[user.id]:
                     del self.user_connections[user.id]
-                print(f"User client disconnected: {user.username} ({websocket.client.host})")
+                logger.debug("User client disconnected: %s (%s)", user.username, websocket.client.host)
         else:
             if websocket in self.anonymous_connections:
                 self.anonymous_connections.remove(websocket)
-                print(f"Anonymous client disconnected: {websocket.client.host}")
+                logger.debug("Anonymous client disconnected: %s", websocket.client.host)
 
     async def listen_for_messages(self, websocket: WebSocket, user: Optional[models.User] = None):
         """
@@ -65,100 +178,137 @@ class WebSocketManager:
         try:
             while True:
                 data = await websocket.receive_text()
+                # Keep-alive pings are by far the most common frame, and the frontend always
+                # sends the same text, so they are answered without decoding any JSON.
+                if data == PING_FRAME:
+                    await self._send_text(websocket, PONG_FRAME)
+                    continue
+                if not data.startswith("{"):
+                    continue # Not a JSON object, nothing to handle
                 try:
-                    message = json.loads(data)
+                    message = orjson.loads(data)
                     if isinstance(message, dict) and message.get("type") == "ping":
-                        await self.send_personal_json(websocket, {"type": "pong"})
+                        await self._send_text(websocket, PONG_FRAME)
                         # Ping/Pong message for debugging websocket
-                        # print(f'Received ping from user client: {user.username}')
-                except (json.JSONDecodeError, AttributeError):
+                        # logger.debug('Received ping from user client: %s', user.username)
+                except (orjson.JSONDecodeError, AttributeError):
                     # Not a JSON message or not the structure we expect. Ignore for ping purposes.
                     pass
         except WebSocketDisconnect:
-            print(f"Client disconnected: {websocket.client.host}")
+            logger.debug("Client disconnected: %s", websocket.client.host)
         finally:
             self.disconnect(websocket, user)
 
-    async def _send_json(self, websocket: WebSocket, message: dict):
+    async def _send_text(self, websocket: WebSocket, payload: str) -> bool:
+        # Returns False if the send failed, which means the socket is dead.
         try:
-            await websocket.send_json(message)
+            await websocket.send_text(payload)
+            return True
         except Exception as e:
             # This can happen if the client disconnects abruptly
-            print(f"Error sending message to client {websocket.client.host}: {e}")
+            logger.debug("Error sending message to client %s: %s", websocket.client.host, e)
+            return False
+
+    async def _send_json(self, websocket: WebSocket, message: dict):
+        # Encoded with orjson rather than Starlette's stdlib json. Still sent as a text
+        # frame, since the frontend parses event.data as a string.
+        await self._send_text(websocket, orjson.dumps(message).decode())
+
+    def _remove_socket(self, websocket: WebSocket):
+        # Drops a socket from whichever group holds it, for sends that failed mid-broadcast.
+        self._unlist(websocket)
+        if websocket in self.anonymous_connections:
+            self.anonymous_connections.remove(websocket)
+            return
+        for groups in (self.admin_connections, self.user_connections):
+            for user_id, sockets in list(groups.items()):
+                if websocket in sockets:
+                    sockets.remove(websocket)
+                    if not sockets:
+                        del groups[user_id]
+                    return
+
+    async def _fan_out(self, connections: Sequence[WebSocket], message: dict):
+        """
+        Sends one message to many clients concurrently. The message is encoded once
+        for all of them, and sockets whose send fails are dropped straight away
+        instead of lingering until their listener notices the disconnect.
+        """
+        await self._fan_out_text(connections, orjson.dumps(message).decode())
+
+    async def _fan_out_text(self, connections: Sequence[WebSocket], payload: str):
+        # Sends an already-encoded text frame to many clients, see _fan_out.
+        if not connections:
+            return
+        # Snapshot, since sockets can connect or disconnect while the sends are awaited.
+        # The flat connection tuples are passed through as-is; tuple() doesn't copy them.
+        connections = tuple(connections)
+        results = await asyncio.gather(*(self._send_text(ws, payload) for ws in connections))
+        for ws, ok in zip(connections, results):
+            if not ok:
+                self._remove_socket(ws)
     
-    async def _debounced_broadcast_task(self, admin_only: bool):
-        # The actual task that waits and then sends the broadcast.
-        await asyncio.sleep(self.debounce_delay)
-        message = {"type": "refresh_images", "reason": "batch_update"}
-        
+    def _fire_refresh(self, admin_only: bool):
+        # Timer callback: the debounce delay passed without another schedule call, so send the refresh.
         if admin_only:
-            await self.broadcast_to_admins_json(message)
-            self.admin_debounce_task = None
+            self._admin_refresh_timer = None
+            targets = self._admin_ws
         else:
-            await self.broadcast_json(message)
-            self.public_debounce_task = None
+            self._public_refresh_timer = None
+            targets = self._all_ws
+        task = asyncio.get_running_loop().create_task(self._fan_out_text(targets, REFRESH_BATCH_FRAME))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
 
     async def schedule_refresh_broadcast(self, admin_only: bool = False):
         # Schedules a 'refresh_images' broadcast, debouncing rapid calls.
         # Manages separate debounces for public and admin-only refreshes.
+        # Each call only re-arms a timer; a task is created once, when the timer actually fires.
+        loop = asyncio.get_running_loop()
         if admin_only:
             # If a public broadcast is already scheduled, admins will get it, so we don't need a separate admin one.
-            if self.public_debounce_task and not self.public_debounce_task.done():
+            if self._public_refresh_timer:
                 return
 
-            if self.admin_debounce_task and not self.admin_debounce_task.done():
-                self.admin_debounce_task.cancel()
+            if self._admin_refresh_timer:
+                self._admin_refresh_timer.cancel()
             
-            self.admin_debounce_task = asyncio.create_task(self._debounced_broadcast_task(admin_only=True))
+            self._admin_refresh_timer = loop.call_later(self.debounce_delay, self._fire_refresh, True)
         else: # Public broadcast
             # If an admin-only broadcast is scheduled, cancel it because this public one will cover admins too.
-            if self.admin_debounce_task and not self.admin_debounce_task.done():
-                self.admin_debounce_task.cancel()
+            if self._admin_refresh_timer:
+                self._admin_refresh_timer.cancel()
+                self._admin_refresh_timer = None
             
-            if self.public_debounce_task and not self.public_debounce_task.done():
-                self.public_debounce_task.cancel()
+            if self._public_refresh_timer:
+                self._public_refresh_timer.cancel()
 
-            self.public_debounce_task = asyncio.create_task(self._debounced_broadcast_task(admin_only=False))
+            self._public_refresh_timer = loop.call_later(self.debounce_delay, self._fire_refresh, False)
 
     async def broadcast_json(self, message: dict):
         # Sends a JSON message to all connected clients (anonymous, users, and admins).
-        admin_sockets = [ws for sockets in self.admin_connections.values() for ws in sockets]
-        user_sockets = [ws for sockets in self.user_connections.values() for ws in sockets]
-        all_connections = self.anonymous_connections + user_sockets + admin_sockets
-        # Use asyncio.gather for concurrent sending to all clients
-        if all_connections:
-            await asyncio.gather(*(self._send_json(conn, message) for conn in all_connections))
+        await self._fan_out(self._all_ws, message)
 
     async def broadcast_to_admins_json(self, message: dict):
         # Sends a JSON message only to authenticated admin clients.
-        for sockets in self.admin_connections.values():
-            for connection in sockets:
-                await self._send_json(connection, message)
+        await self._fan_out(self._admin_ws, message)
 
     async def broadcast_to_users_json(self, message: dict):
         # Sends a JSON message to all authenticated clients (admins and non-admins).
-        print("Broadcasting message to all authenticated users.")
-        admin_sockets = [ws for sockets in self.admin_connections.values() for ws in sockets]
-        user_sockets = [ws for sockets in self.user_connections.values() for ws in sockets]
-        all_user_connections = user_sockets + admin_sockets
-        for connection in all_user_connections:
-            await self._send_json(connection, message)
+        logger.debug("Broadcasting message to all authenticated users.")
+        await self._fan_out(self._authed_ws, message)
 
     async def broadcast_to_non_admins_json(self, message: dict):
         # Sends a JSON message only to authenticated non-admin clients.
-        print("Broadcasting message to non-admin clients.")
-        for sockets in self.user_connections.values():
-            for connection in sockets:
-                await self._send_json(connection, message)
+        logger.debug("Broadcasting message to non-admin clients.")
+        await self._fan_out([ws for sockets in self.user_connections.values() for ws in sockets], message)
 
     async def send_personal_json(self, websocket: WebSocket, message: dict):
         # Sends a JSON message to a specific client.
         await self._send_json(websocket, message)
 
     def get_all_connections(self) -> List[WebSocket]:
-        admin_sockets = [ws for sockets in self.admin_connections.values() for ws in sockets]
-        user_sockets = [ws for sockets in self.user_connections.values() for ws in sockets]
-        return self.anonymous_connections + user_sockets + admin_sockets
+        return list(self._all_ws)
 
     async def send_toast_and_log(
         self,
@@ -175,7 +325,7 @@ class WebSocketManager:
         """
         Logs a message to the database and sends a toast notification via WebSocket.
 
-        :param db: The database session.
+        :param db: The database session, used only when the background log writer is not running.
         :param message: The message to log and display.
         :param level: The message level ('SUCCESS', 'INFO', 'WARNING', 'ERROR').
         :param user_id: The ID of the user associated with the event. If provided, the toast is sent to this user.
@@ -185,19 +335,18 @@ class WebSocketManager:
         :param toast_duration: Duration for the toast message in milliseconds.
         :param toast_position: Position of the toast on screen (e.g., 'top-left', 'bottom-center').
         """
-        # 1. Create Log entry
-        try:
-            log_entry = models.Log(
-                message=message,
-                level=level.upper(),
-                user_id=user_id,
-                source=source
-            )
-            db.add(log_entry)
-            db.commit()
-        except Exception as e:
-            print(f"Failed to write to log: {e}")
-            db.rollback()
+        # 1. Create Log entry. Normally it is queued and written in the background, so the
+        # event loop never waits on a commit; without a running queue it is written directly.
+        log_entry = {"message": message, "level": level.upper(), "user_id": user_id, "source": source}
+        if self._log_queue is not None:
+            await self._log_queue.put(log_entry)
+        else:
+            try:
+                db.add(models.Log(**log_entry))
+                db.commit()
+            except Exception as e:
+                logger.error("Failed to write to log: %s", e)
+                db.rollback()
 
         # 2. Prepare WebSocket message
         options = {"duration": toast_duration}
@@ -217,9 +366,7 @@ class WebSocketManager:
         elif user_id:
             admin_sockets = self.admin_connections.get(user_id, [])
             user_sockets = self.user_connections.get(user_id, [])
-            tasks = [self.send_personal_json(ws, toast_message) for ws in admin_sockets + user_sockets]
-            if tasks:
-                await asyncio.gather(*tasks)
+            await self._fan_out(admin_sockets + user_sockets, toast_message)
 
 # Create a single instance of the manager to be used across the application
 manager = WebSocketManager()
@@ -130,21 +130,14 @@ function ImageGrid({
         queryString.set('active_stages_json', JSON.stringify(activeStages));
       }
       if (pageParam) {
-        queryString.set('last_sort_value', pageParam.last_sort_value);
-        queryString.set('last_content_id', pageParam.last_content_id);
-        queryString.set('last_location_id', pageParam.last_location_id);
+        queryString.set('cursor', pageParam);
       }
       return fetchImagesApi(token, queryString);
     },
     getNextPageParam: (lastPage) => {
       if (!lastPage || lastPage.length === 0) return undefined;
-      const lastImage = lastPage[lastPage.length - 1];
-
-      return {
-        last_sort_value: lastImage.sort_value !== undefined ? lastImage.sort_value : lastImage.date_created,
-        last_content_id: lastImage.content_id,
-        last_location_id: lastImage.id,
-      };
+      // The backend attaches an opaque pagination cursor to the last image of each page.
+      return lastPage[lastPage.length - 1].cursor ?? undefined;
     },
   });
 
@@ -6,12 +6,17 @@ import { useAuth } from '../../context/AuthContext';
 function LogViewer() {
     const { token } = useAuth();
     const queryClient = useQueryClient();
-    const [page, setPage] = useState(1);
+    // Stack of cursors for the pages visited so far; the first page has no cursor.
+    const [cursors, setCursors] = useState([null]);
+    const cursor = cursors[cursors.length - 1];
+    const page = cursors.length;
     const limit = 50;
 
     const fetchLogs = async ({ queryKey }) => {
-        const [_key, { page, limit }] = queryKey;
-        const response = await fetch(`/api/logs/?skip=${(page - 1) * limit}&limit=${limit}`, {
+        const [_key, { cursor, limit }] = queryKey;
+        const params = new URLSearchParams({ limit });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/logs/?${params.toString()}`, {
             headers: {
                 Authorization: `Bearer ${token}`,
             },
@@ -35,7 +40,7 @@ function LogViewer() {
     };
 
     const { data, isLoading, isError, error } = useQuery({
-        queryKey: ['logs', { page, limit }],
+        queryKey: ['logs', { cursor, limit }],
         queryFn: fetchLogs,
         keepPreviousData: true,
         enabled: !!token,
@@ -44,6 +49,7 @@ function LogViewer() {
     const clearMutation = useMutation({
         mutationFn: clearLogs,
         onSuccess: () => {
+            setCursors([null]);
             queryClient.invalidateQueries(['logs']);
             // The backend sends a toast on success, so no need to add one here.
         },
@@ -60,6 +66,7 @@ function LogViewer() {
 
     const logs = data?.logs ?? [];
     const total = data?.total ?? 0;
+    const nextCursor = data?.next_cursor ?? null;
 
     return (
         <div className="log-viewer-container">
@@ -88,10 +95,10 @@ function LogViewer() {
             </div>
             <div className="pagination-controls">
                 <span>Page {page} of {Math.ceil(total / limit)}</span>
-                <button onClick={() => setPage(p => Math.max(p - 1, 1))} disabled={page === 1}>
+                <button onClick={() => setCursors(c => (c.length > 1 ? c.slice(0, -1) : c))} disabled={page === 1}>
                     Previous
                 </button>
-                <button onClick={() => setPage(p => (p * limit < total ? p + 1 : p))} disabled={page * limit >= total}>
+                <button onClick={() => nextCursor && setCursors(c => [...c, nextCursor])} disabled={!nextCursor}>
                     Next
                 </button>
             </div>
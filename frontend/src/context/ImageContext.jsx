@@ -10,10 +10,8 @@ export const ImageProvider = ({ children }) => {
   const [images, setImages] = useState([]);
   const [imagesLoading, setImagesLoading] = useState(false);
   const [imagesError, setImagesError] = useState(null);
-  // Use refs for cursors to prevent stale closures and dependency loops.
-  const lastSortValueRef = useRef(null);
-  const lastContentIdRef = useRef(null);
-  const lastLocationIdRef = useRef(null);
+  // Use a ref for the cursor to prevent stale closures and dependency loops.
+  const cursorRef = useRef(null);
 
   const [hasMore, setHasMore] = useState(true);
   const [isFetchingMore, setIsFetchingMore] = useState(false);
@@ -49,10 +47,8 @@ export const ImageProvider = ({ children }) => {
       queryString.append('sort_order', sortOrder);
 
       if (searchTerm) queryString.append('search_query', searchTerm);
-      // For "load more", include pagination cursors.
-      if (!isInitialLoad && lastSortValueRef.current) queryString.append('last_sort_value', lastSortValueRef.current);
-      if (!isInitialLoad && lastContentIdRef.current) queryString.append('last_content_id', lastContentIdRef.current);
-      if (!isInitialLoad && lastLocationIdRef.current) queryString.append('last_location_id', lastLocationIdRef.current);
+      // For "load more", include the pagination cursor.
+      if (!isInitialLoad && cursorRef.current) queryString.append('cursor', cursorRef.current);
       if (trash_only) queryString.append('trash_only', 'true');
 
       if (filters) {
@@ -76,15 +72,7 @@ export const ImageProvider = ({ children }) => {
       }
 
       if (data.length > 0) {
-        const newLastImage = data[data.length - 1];
-        lastLocationIdRef.current = newLastImage.id;
-        lastContentIdRef.current = newLastImage.content_id;
-        let valForSort = newLastImage[sortBy];
-        if (sortBy === 'date_created' && valForSort) {
-          const date = new Date(valForSort.replace(' ', 'T'));
-          if (!isNaN(date.getTime())) valForSort = date.toISOString();
-        }
-        lastSortValueRef.current = valForSort;
+        cursorRef.current = data[data.length - 1].cursor ?? null;
       }
 
       setHasMore(data.length === limit);
@@ -102,9 +90,7 @@ export const ImageProvider = ({ children }) => {
   useEffect(() => {
     if (isAuthenticated && imagesPerPage > 0) {
       // Reset cursors and trigger a new fetch.
-      lastSortValueRef.current = null;
-      lastContentIdRef.current = null;
-      lastLocationIdRef.current = null;
+      cursorRef.current = null;
       setHasMore(true);
       fetchImages(true);
     } else if (!isAuthenticated) {
@@ -113,9 +99,7 @@ export const ImageProvider = ({ children }) => {
       setIsFetchingMore(false);
       setHasMore(false);
       setImagesError(null);
-      lastSortValueRef.current = null;
-      lastContentIdRef.current = null;
-      lastLocationIdRef.current = null;
+      cursorRef.current = null;
     }
   }, [isAuthenticated, imagesPerPage, searchTerm, sortBy, sortOrder, filters, trash_only]);
 